@@ -0,0 +1,116 @@
+# agent/availability.py
+
+import bisect
+from datetime import datetime
+
+
+def _parse(ts):
+    # Google returns RFC3339 with a trailing "Z" for UTC.
+    return datetime.fromisoformat(ts.replace("Z", "+00:00"))
+
+
+def is_busy(event):
+    """Whether an event blocks time: not cancelled, not marked free, not declined by the user."""
+    if event.get("status") == "cancelled" or event.get("transparency") == "transparent":
+        return False
+    return not any(a.get("self") and a.get("responseStatus") == "declined" for a in event.get("attendees") or ())
+
+
+def merge_intervals(intervals):
+    """Sort and coalesce overlapping/adjacent (start, end) pairs."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(s, e) for s, e in merged]
+
+
+class BusyIntervals:
+    """Sorted, non-overlapping busy intervals with O(log n) lookups."""
+
+    def __init__(self, intervals=()):
+        self.intervals = merge_intervals(intervals)
+        self._starts = [s for s, _ in self.intervals]
+
+    @classmethod
+    def from_freebusy(cls, response):
+        """Build from a freebusy().query() response covering any number of calendars."""
+        intervals = []
+        for cal in response.get("calendars", {}).values():
+            for busy in cal.get("busy", []):
+                intervals.append((_parse(busy["start"]), _parse(busy["end"])))
+        return cls(intervals)
+
+    @classmethod
+    def from_events(cls, events):
+        intervals = []
+        for e in events:
+            if not is_busy(e):
+                continue
+            start, end = e["start"].get("dateTime"), e["end"].get("dateTime")
+            if start and end:
+                intervals.append((_parse(start), _parse(end)))
+        return cls(intervals)
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def add(self, start, end):
+        """Insert [start, end), coalescing with any neighbours it touches."""
+        i = bisect.bisect_left(self._starts, start)
+        # Step back if the previous interval reaches into the new one.
+        if i > 0 and self.intervals[i - 1][1] >= start:
+            i -= 1
+        j = i
+        while j < len(self.intervals) and self.intervals[j][0] <= end:
+            start = min(start, self.intervals[j][0])
+            end = max(end, self.intervals[j][1])
+            j += 1
+        self.intervals[i:j] = [(start, end)]
+        self._starts[i:j] = [start]
+
+    def remove(self, start, end):
+        """Free [start, end), trimming or splitting any interval it cuts through."""
+        i = bisect.bisect_right(self._starts, start) - 1
+        if i < 0 or self.intervals[i][1] <= start:
+            i += 1
+        j = i
+        pieces = []
+        while j < len(self.intervals) and self.intervals[j][0] < end:
+            busy_start, busy_end = self.intervals[j]
+            if busy_start < start:
+                pieces.append((busy_start, start))
+            if busy_end > end:
+                pieces.append((end, busy_end))
+            j += 1
+        self.intervals[i:j] = pieces
+        self._starts[i:j] = [s for s, _ in pieces]
+
+    def overlapping(self, start, end):
+        """Busy intervals that intersect [start, end)."""
+        i = bisect.bisect_right(self._starts, start) - 1
+        if i < 0 or self.intervals[i][1] <= start:
+            i += 1
+        result = []
+        while i < len(self.intervals) and self.intervals[i][0] < end:
+            result.append(self.intervals[i])
+            i += 1
+        return result
+
+    def is_free(self, start, end):
+        return not self.overlapping(start, end)
+
+    def free_slots(self, start, end):
+        """Gaps between busy intervals inside [start, end)."""
+        slots = []
+        cursor = start
+        for busy_start, busy_end in self.overlapping(start, end):
+            if busy_start > cursor:
+                slots.append((cursor, busy_start))
+            cursor = max(cursor, busy_end)
+        if cursor < end:
+            slots.append((cursor, end))
+        return slots
@@ -1,20 +1,143 @@
 import os
 import json
-import streamlit as st
-from datetime import datetime, timedelta, timezone
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from agent.oauth_utils import get_google_flow
-from agent.token_store import stored_token
+import asyncio
+import hashlib
+import logging
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
+from datetime import datetime
+from googleapiclient.errors import HttpError
+from google.auth.exceptions import RefreshError
+from agent.oauth_utils import get_google_flow, SCOPES
+from agent.availability import BusyIntervals
+from agent.event_cache import EventStore, EVENT_FIELDS, RECURRENCE_FIELDS, event_bounds
+from agent.recurrence import expand
+from agent.metrics import observe_dependency
+from agent.rate_limit import calendar_scheduler, CalendarOverloaded, is_rate_limited, backoff, \
+    CALENDAR_MAX_RETRIES, RETRIES
+from agent.logs import fields
 
+log = logging.getLogger(__name__)
 
 # Allow HTTP (for local dev)
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '0'
 
-def get_auth_url():
-    """Generate the Google OAuth URL for user authorization."""
+# Built service objects, keyed by a hash of the credential JSON.
+SERVICE_CACHE_SIZE = int(os.getenv("CALENDAR_SERVICE_CACHE_SIZE", "256"))
+SERVICE_CACHE_TTL = int(os.getenv("CALENDAR_SERVICE_CACHE_TTL", "1800"))
+HTTP_TIMEOUT = int(os.getenv("CALENDAR_HTTP_TIMEOUT", "30"))
+
+_service_cache = TTLCache(maxsize=SERVICE_CACHE_SIZE, ttl=SERVICE_CACHE_TTL)
+_service_cache_lock = threading.Lock()
+_service_cache_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+# googleapiclient is blocking; async callers run it on this bounded pool so
+# the event loop never waits on Google.
+CALENDAR_MAX_WORKERS = int(os.getenv("CALENDAR_MAX_WORKERS", "32"))
+_executor = ThreadPoolExecutor(max_workers=CALENDAR_MAX_WORKERS, thread_name_prefix="calendar")
+
+# Calendars consulted for availability; freebusy accepts up to 50 per query.
+DEFAULT_CALENDAR_IDS = [c.strip() for c in os.getenv("CALENDAR_IDS", "primary").split(",") if c.strip()]
+FREEBUSY_MAX_CALENDARS = 50
+# Page size for streamed event listings (the API caps it at 2500).
+EVENTS_PAGE_SIZE = int(os.getenv("CALENDAR_EVENTS_PAGE_SIZE", "250"))
+# Expand recurring series locally instead of asking Google for every instance.
+LOCAL_RECURRENCE = os.getenv("CALENDAR_LOCAL_RECURRENCE", "0") == "1"
+# Calendar accepts at most 50 calls per batch HTTP request.
+BATCH_CHUNK_SIZE = 50
+
+# Identical concurrent reads share one upstream call; results are then
+# reused for COALESCE_TTL seconds (0 disables the result cache).
+COALESCE_TTL = float(os.getenv("CALENDAR_COALESCE_TTL", "2"))
+
+# Local syncToken-backed event store; set EVENT_CACHE_ENABLED=0 to always ask Google.
+EVENT_CACHE_ENABLED = os.getenv("EVENT_CACHE_ENABLED", "1") == "1"
+_event_store = None
+_event_store_lock = threading.Lock()
+# (user, calendar) pairs whose events can't be listed (shared free/busy only,
+# or gone); they are answered by freebusy without retrying the listing.
+_unlistable = TTLCache(maxsize=4096, ttl=SERVICE_CACHE_TTL)
+_unlistable_lock = threading.Lock()
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one.
+
+    The first caller (the leader) runs the function; everyone arriving
+    while it is in flight waits and receives the same result or exception.
+    Successful results are kept for `ttl` seconds.
+    """
+
+    def __init__(self, ttl=COALESCE_TTL, maxsize=4096):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._results = TTLCache(maxsize=maxsize, ttl=ttl) if ttl > 0 else None
+        self.stats = {"leaders": 0, "coalesced": 0, "cached": 0}
+
+    def do(self, key, func):
+        with self._lock:
+            if self._results is not None and key in self._results:
+                self.stats["cached"] += 1
+                return self._results[key]
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+                self.stats["leaders"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            if self._results is not None:
+                with self._lock:
+                    self._results[key] = call.result
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            call.done.set()
+
+    def forget(self, prefix):
+        """Drop cached results whose key starts with prefix (e.g. after a write)."""
+        if self._results is None:
+            return
+        with self._lock:
+            for key in [k for k in self._results.keys() if k[:len(prefix)] == prefix]:
+                self._results.pop(key, None)
+
+
+_reads = SingleFlight()
+
+
+def coalescing_stats():
+    with _reads._lock:
+        return dict(_reads.stats)
+
+
+def get_auth_url(state=None):
+    """Generate the Google OAuth URL for user authorization; `state` comes back on the redirect."""
     flow = get_google_flow()
-    auth_url, _ = flow.authorization_url(prompt='consent')
+    auth_url, _ = flow.authorization_url(prompt='consent', state=state)
     return auth_url
 
 def save_token_from_code(auth_response_url):
@@ -22,42 +145,398 @@ def save_token_from_code(auth_response_url):
     flow = get_google_flow()
     flow.fetch_token(authorization_response=auth_response_url)
     creds = flow.credentials
+    import streamlit as st  # only the frontend calls this
     st.session_state["token"] = creds.to_json()
 
-def get_calendar_service(token: str = None):
-    print("🔍 Inside get_calendar_service(token)")
-    token = token or stored_token.get("token")  # fallback if not explicitly passed
-    print("🧪 Token used:", token)
+class _CachedService:
+    """A built Calendar service plus the per-thread HTTP transports it uses.
+
+    httplib2.Http is not thread-safe, so every thread gets its own
+    AuthorizedHttp which is then reused (keep-alive) for later requests
+    made by that thread through this service.
+    """
+
+    def __init__(self, creds):
+        self.creds = creds
+        self.created_at = time.monotonic()
+        self._local = threading.local()
+        from googleapiclient.discovery import build
+        with observe_dependency("calendar", "build"):
+            self.service = build(
+                "calendar", "v3",
+                credentials=creds,
+                static_discovery=True,  # bundled discovery doc, no network fetch
+                requestBuilder=self._build_request,
+                cache_discovery=False,
+            )
+
+    def _http(self):
+        http = getattr(self._local, "http", None)
+        if http is None:
+            import httplib2
+            import google_auth_httplib2
+            http = google_auth_httplib2.AuthorizedHttp(
+                self.creds, http=httplib2.Http(timeout=HTTP_TIMEOUT)
+            )
+            self._local.http = http
+        return http
+
+    def _build_request(self, _http, *args, **kwargs):
+        from googleapiclient.http import HttpRequest
+        return HttpRequest(self._http(), *args, **kwargs)
+
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def invalidate_calendar_service(token: str):
+    """Drop the cached service for this token (e.g. after revoke/refresh)."""
+    with _service_cache_lock:
+        if _service_cache.pop(_token_key(token), None) is not None:
+            _service_cache_stats["evictions"] += 1
 
+
+def update_cached_credentials(old_token: str, new_token: str, creds):
+    """Swap refreshed credentials into the cached service for old_token.
+
+    The entry keeps serving requests that still present old_token and is
+    also filed under new_token, so neither pays a rebuild.
+    """
+    with _service_cache_lock:
+        entry = _service_cache.get(_token_key(old_token))
+        if entry is None:
+            return
+        entry.creds.token = creds.token
+        entry.creds.expiry = creds.expiry
+        _service_cache[_token_key(new_token)] = entry
+
+
+def clear_service_cache():
+    with _service_cache_lock:
+        _service_cache.clear()
+
+
+def service_cache_stats():
+    with _service_cache_lock:
+        return {**_service_cache_stats, "size": len(_service_cache)}
+
+
+def user_key(token: str) -> str:
+    """Stable per-user identity; survives access-token refreshes."""
+    info = json.loads(token)
+    return hashlib.sha256((info.get("refresh_token") or token).encode("utf-8")).hexdigest()
+
+
+def get_event_store():
+    global _event_store
+    if not EVENT_CACHE_ENABLED:
+        return None
+    with _event_store_lock:
+        if _event_store is None:
+            _event_store = EventStore(local_recurrence=LOCAL_RECURRENCE)
+    return _event_store
+
+
+def _listing_denied(error):
+    """A 403/404 that means the calendar's events can't be listed, not "slow down"."""
+    return isinstance(error, HttpError) and error.resp.status in (403, 404) and not is_rate_limited(error)
+
+
+def _require_token(token):
     if not token:
         raise ValueError("❌ No token found! User must authenticate first.")
 
-    creds = Credentials.from_authorized_user_info(
-        json.loads(token),
-        ["https://www.googleapis.com/auth/calendar.events"]
-    )
-    return build("calendar", "v3", credentials=creds)
 
+def get_calendar_service(token: str = None):
+    _require_token(token)
+
+    key = _token_key(token)
+    with _service_cache_lock:
+        entry = _service_cache.get(key)
+        # Expired credentials that can't refresh themselves are useless;
+        # anything else is refreshed in place by the AuthorizedHttp.
+        if entry is not None and entry.creds.expired and not entry.creds.refresh_token:
+            _service_cache.pop(key, None)
+            _service_cache_stats["evictions"] += 1
+            entry = None
+        if entry is not None:
+            _service_cache_stats["hits"] += 1
+            return entry.service
+        _service_cache_stats["misses"] += 1
+
+    from google.oauth2.credentials import Credentials
+    info = json.loads(token)
+    # Keep the scopes the user actually granted so refreshes don't ask for more.
+    creds = Credentials.from_authorized_user_info(info, info.get("scopes") or SCOPES)
+    entry = _CachedService(creds)
+    with _service_cache_lock:
+        # Another thread may have built it meanwhile; keep the first one.
+        existing = _service_cache.get(key)
+        if existing is not None:
+            return existing.service
+        _service_cache[key] = entry
+    return entry.service
+
+
+def warmup():
+    """Import the Google client stack and parse the bundled discovery doc once,
+    so the first real request doesn't pay for it."""
+    import httplib2
+    import google_auth_httplib2  # noqa: F401
+    from google.oauth2.credentials import Credentials  # noqa: F401
+    from googleapiclient.discovery import build
+    with observe_dependency("calendar", "warmup"):
+        build("calendar", "v3", http=httplib2.Http(), static_discovery=True, cache_discovery=False)
+    get_event_store()
+
+
+def _execute(request, token: str, admitted=False):
+    """Run a Calendar API request through the rate limiter, evicting the
+    cached service if the credential turns out to be revoked."""
+    def run():
+        with observe_dependency("calendar", getattr(request, "methodId", "") or ""):
+            return request.execute()
+
+    try:
+        return calendar_scheduler.call(user_key(token), run, admitted=admitted)
+    except RefreshError:
+        invalidate_calendar_service(token)
+        raise
+    except HttpError as e:
+        if e.resp.status == 401:
+            invalidate_calendar_service(token)
+        raise
+
+
+def iter_events(token: str, time_min, time_max, calendar_id='primary', page_size=None, local_recurrence=None):
+    """Yield events in [time_min, time_max) page by page, in start order.
+
+    Requests carry a fields= mask (id, summary, start, end, status,
+    transparency) and follow nextPageToken, so long windows are never
+    truncated and only one page is held in memory; stop iterating to
+    stop fetching.
+
+    With local_recurrence (default CALENDAR_LOCAL_RECURRENCE) recurring
+    series are fetched once each and expanded here; see iter_events_expanded.
+    """
+    if isinstance(time_min, str):
+        time_min = datetime.fromisoformat(time_min)
+    if isinstance(time_max, str):
+        time_max = datetime.fromisoformat(time_max)
+    if LOCAL_RECURRENCE if local_recurrence is None else local_recurrence:
+        yield from iter_events_expanded(token, time_min, time_max, calendar_id, page_size)
+        return
+    yield from _iter_single_events(token, time_min.isoformat(), time_max.isoformat(), calendar_id, page_size)
+
+
+def iter_events_expanded(token: str, time_min: datetime, time_max: datetime, calendar_id='primary', page_size=None):
+    """Same instances as singleEvents=True, expanded from RRULE/EXDATE locally.
 
-def check_availability(token: str):
+    The listing (singleEvents=False) carries each series once, plus
+    one-offs and modified/cancelled instances, so daily standups cost one
+    item instead of one per day. The listing is read fully (masters can be
+    on any page) and then expanded lazily in start order. Series whose
+    rules can't be parsed make the call fall back to server-side expansion.
+    """
     service = get_calendar_service(token)
-    print("📅 Checking calendar availability...")  # 🔍 DEBUG
-    print("🧪 Token in backend memory:", stored_token.get("token"))  # 🔍 DEBUG
+    items = []
+    page_token = None
+    while True:
+        request = service.events().list(
+            calendarId=calendar_id,
+            timeMin=time_min.isoformat(),
+            timeMax=time_max.isoformat(),
+            singleEvents=False,
+            maxResults=page_size or EVENTS_PAGE_SIZE,
+            fields=f"items({RECURRENCE_FIELDS}),nextPageToken",
+            pageToken=page_token,
+        )
+        page = _execute(request, token)
+        items.extend(page.get('items', []))
+        page_token = page.get('nextPageToken')
+        if not page_token:
+            break
+    try:
+        expanded = expand(items, time_min, time_max)
+    except (ValueError, TypeError) as e:
+        log.warning("local_recurrence_failed", extra=fields(calendar_id=calendar_id, error=str(e)))
+        expanded = _iter_single_events(token, time_min.isoformat(), time_max.isoformat(), calendar_id, page_size)
+    yield from expanded
+
+
+def _iter_single_events(token, time_min, time_max, calendar_id, page_size):
     service = get_calendar_service(token)
-    now = datetime.now(timezone.utc).isoformat()
-    tomorrow = (datetime.now(timezone.utc) + timedelta(days=1)).isoformat()
+    page_token = None
+    while True:
+        request = service.events().list(
+            calendarId=calendar_id,
+            timeMin=time_min,
+            timeMax=time_max,
+            singleEvents=True,
+            orderBy='startTime',
+            maxResults=page_size or EVENTS_PAGE_SIZE,
+            fields=f"items({EVENT_FIELDS}),nextPageToken",
+            pageToken=page_token,
+        )
+        page = _execute(request, token)
+        yield from page.get('items', [])
+        page_token = page.get('nextPageToken')
+        if not page_token:
+            return
+
+
+def get_busy_intervals(token: str, time_min: datetime, time_max: datetime, calendar_ids=None):
+    """Busy intervals across calendar_ids for [time_min, time_max) via freebusy.
 
-    events_result = service.events().list(
-        calendarId='primary',
-        timeMin=now,
-        timeMax=tomorrow,
-        singleEvents=True,
-        orderBy='startTime'
-    ).execute()
+    Served from the local event store when enabled and the window starts
+    inside its horizon (an incremental sync at most every
+    EVENT_CACHE_MAX_STALENESS seconds). Otherwise only
+    start/end pairs come back from Google, never event bodies. Tokens granted
+    before the freebusy scope was requested fall back to listing events.
+    Identical concurrent calls share one upstream read.
+    """
+    _require_token(token)
+    calendar_ids = tuple(calendar_ids or DEFAULT_CALENDAR_IDS)
+    return _reads.do(
+        (user_key(token), "busy", calendar_ids, time_min, time_max),
+        lambda: _get_busy_intervals(token, time_min, time_max, calendar_ids),
+    )
 
-    return events_result.get('items', [])
 
-def book_event(summary, start_time, end_time, token: str):
+def _get_busy_intervals(token, time_min, time_max, calendar_ids):
+    service = get_calendar_service(token)
+    intervals = []
+
+    store = get_event_store()
+    if store is not None and store.covers(time_min):
+        key = user_key(token)
+        # Calendars shared free/busy only can't be synced; freebusy answers for them.
+        remaining = []
+        try:
+            for cal_id in calendar_ids:
+                sync = lambda: store.sync(service, key, cal_id, execute=lambda r: _execute(r, token))
+                if _is_unlistable(key, cal_id) or not _listed(key, cal_id, sync):
+                    remaining.append(cal_id)
+                    continue
+                intervals.extend(store.busy_intervals(key, cal_id, time_min, time_max))
+        except (ValueError, TypeError) as e:
+            # A stored series whose rules can't be expanded; let freebusy answer.
+            log.warning("local_recurrence_failed", extra=fields(error=str(e)))
+            intervals, remaining = [], calendar_ids
+        if not remaining:
+            return BusyIntervals(intervals)
+        calendar_ids = tuple(remaining)
+
+    try:
+        for i in range(0, len(calendar_ids), FREEBUSY_MAX_CALENDARS):
+            chunk = calendar_ids[i:i + FREEBUSY_MAX_CALENDARS]
+            request = service.freebusy().query(body={
+                "timeMin": time_min.isoformat(),
+                "timeMax": time_max.isoformat(),
+                "items": [{"id": cal_id} for cal_id in chunk],
+            })
+            intervals.extend(BusyIntervals.from_freebusy(_execute(request, token)).intervals)
+    except HttpError as e:
+        # A 403 that means "slow down" must not turn into a heavier listing.
+        if e.resp.status != 403 or is_rate_limited(e):
+            raise
+        for cal_id in calendar_ids:
+            intervals.extend(BusyIntervals.from_events(iter_events(token, time_min, time_max, cal_id)).intervals)
+    return BusyIntervals(intervals)
+
+
+def get_events(token: str, time_min: datetime, time_max: datetime, calendar_ids=None):
+    """Events across calendar_ids overlapping [time_min, time_max), in start order.
+
+    For schedule questions, which need titles that freebusy doesn't carry.
+    Served from the local event store under the same conditions as
+    get_busy_intervals, otherwise listed page by page with iter_events.
+    """
+    _require_token(token)
+    calendar_ids = tuple(calendar_ids or DEFAULT_CALENDAR_IDS)
+    return _reads.do(
+        (user_key(token), "events", calendar_ids, time_min, time_max),
+        lambda: _get_events(token, time_min, time_max, calendar_ids),
+    )
+
+
+def _get_events(token, time_min, time_max, calendar_ids):
+    key = user_key(token)
+    # Free/busy-only calendars have no events to show; they are skipped.
+    calendar_ids = [c for c in calendar_ids if not _is_unlistable(key, c)]
+    events = None
+    store = get_event_store()
+    if store is not None and store.covers(time_min):
+        service = get_calendar_service(token)
+        try:
+            events = []
+            for cal_id in calendar_ids:
+                sync = lambda: store.sync(service, key, cal_id, execute=lambda r: _execute(r, token))
+                if _listed(key, cal_id, sync):
+                    events.extend(store.events(key, cal_id, time_min, time_max))
+        except (ValueError, TypeError) as e:
+            log.warning("local_recurrence_failed", extra=fields(error=str(e)))
+            events = None
+    if events is None:
+        events = []
+        for cal_id in calendar_ids:
+            _listed(key, cal_id, lambda: events.extend(iter_events(token, time_min, time_max, cal_id)))
+    events = [e for e in events if e.get("status") != "cancelled"]
+    events.sort(key=lambda e: event_bounds(e)[0])
+    return events
+
+
+def _listed(key, cal_id, list_events):
+    """Run list_events; False (and remember it) if the calendar can't be listed."""
+    try:
+        list_events()
+    except HttpError as e:
+        if not _listing_denied(e):
+            raise
+        with _unlistable_lock:
+            _unlistable[(key, cal_id)] = True
+        return False
+    return True
+
+
+def _is_unlistable(key, cal_id):
+    with _unlistable_lock:
+        return (key, cal_id) in _unlistable
+
+
+def get_busy_by_calendar(token: str, time_min: datetime, time_max: datetime, calendar_ids):
+    """freebusy for up to FREEBUSY_MAX_CALENDARS calendars, kept per calendar.
+
+    Returns (busy, unavailable): busy maps calendar ID -> [(start, end)],
+    unavailable lists IDs Google could not report on (unknown, not shared).
+    """
+    _require_token(token)
+    return _reads.do(
+        (user_key(token), "busy_by_calendar", tuple(calendar_ids), time_min, time_max),
+        lambda: _get_busy_by_calendar(token, time_min, time_max, calendar_ids),
+    )
+
+
+def _get_busy_by_calendar(token, time_min, time_max, calendar_ids):
+    service = get_calendar_service(token)
+    request = service.freebusy().query(body={
+        "timeMin": time_min.isoformat(),
+        "timeMax": time_max.isoformat(),
+        "items": [{"id": cal_id} for cal_id in calendar_ids],
+    })
+    response = _execute(request, token)
+    busy, unavailable = {}, []
+    for cal_id, cal in response.get("calendars", {}).items():
+        if cal.get("errors"):
+            unavailable.append(cal_id)
+            continue
+        busy[cal_id] = BusyIntervals.from_freebusy({"calendars": {cal_id: cal}}).intervals
+    return busy, unavailable
+
+
+def book_event(summary, start_time, end_time, token: str, admitted=False):
+    """Insert one event and return it; admitted=True if the caller already took its rate-limit token."""
     service = get_calendar_service(token)
  
     event = {
@@ -66,5 +545,157 @@ def book_event(summary, start_time, end_time, token: str):
         'end': {'dateTime': end_time, 'timeZone': 'Asia/Kolkata'},
     }
 
-    created_event = service.events().insert(calendarId='primary', body=event).execute()
-    return created_event.get('htmlLink')
+    created_event = _execute(service.events().insert(calendarId='primary', body=event), token, admitted=admitted)
+    _reads.forget((user_key(token),))
+    store = get_event_store()
+    if store is not None:
+        store.write_through(user_key(token), 'primary', created_event)
+    return created_event
+
+
+def reschedule_event(event_id, start_time, end_time, token: str, admitted=False, summary=None):
+    """Move an existing event to [start_time, end_time), retitling it if summary is given; return it."""
+    service = get_calendar_service(token)
+    body = {
+        'start': {'dateTime': start_time, 'timeZone': 'Asia/Kolkata'},
+        'end': {'dateTime': end_time, 'timeZone': 'Asia/Kolkata'},
+    }
+    if summary:
+        body['summary'] = summary
+    updated_event = _execute(
+        service.events().patch(calendarId='primary', eventId=event_id, body=body), token, admitted=admitted)
+    _reads.forget((user_key(token),))
+    store = get_event_store()
+    if store is not None:
+        store.write_through(user_key(token), 'primary', updated_event)
+    return updated_event
+
+
+def book_events_batch(events, token: str, admitted=False):
+    """Insert many (summary, start_time, end_time) events with batch HTTP requests.
+
+    Returns one dict per input, in order, with either "link" or "error";
+    a failing item never fails the rest of its chunk. Items the batch
+    answers with a rate-limit error are sent again, in a batch of their
+    own, after a jittered backoff. If admission control turns a chunk away,
+    the events already inserted keep their links and every item not yet
+    sent gets the overload error. admitted=True if the caller already
+    admitted one request per event.
+    """
+    service = get_calendar_service(token)
+    store = get_event_store()
+    key = user_key(token) if store is not None else None
+    results = [None] * len(events)
+    throttled = {}  # index -> rate-limit error from the last send
+
+    def callback(request_id, response, exception):
+        i = int(request_id)
+        if exception is not None:
+            if is_rate_limited(exception):
+                throttled[i] = exception
+                return
+            if isinstance(exception, HttpError) and exception.resp.status == 401:
+                invalidate_calendar_service(token)
+            results[i] = {"error": str(exception)}
+            return
+        if store is not None:
+            store.write_through(key, 'primary', response)
+        results[i] = {"link": response.get('htmlLink')}
+
+    def send(indices, admitted):
+        batch = service.new_batch_http_request(callback=callback)
+        for i in indices:
+            summary, start_time, end_time = events[i]
+            body = {
+                'summary': summary,
+                'start': {'dateTime': start_time, 'timeZone': 'Asia/Kolkata'},
+                'end': {'dateTime': end_time, 'timeZone': 'Asia/Kolkata'},
+            }
+            batch.add(service.events().insert(calendarId='primary', body=body), request_id=str(i))
+
+        def run():
+            with observe_dependency("calendar", "batch"):
+                batch.execute()
+
+        # Google counts every request inside a batch against the quota.
+        calendar_scheduler.call(key or user_key(token), run, cost=len(indices), admitted=admitted)
+
+    for offset in range(0, len(events), BATCH_CHUNK_SIZE):
+        chunk = range(offset, min(offset + BATCH_CHUNK_SIZE, len(events)))
+        try:
+            send(chunk, admitted)
+            for attempt in range(CALENDAR_MAX_RETRIES):
+                if not throttled:
+                    break
+                retry = sorted(throttled)
+                for error in throttled.values():
+                    RETRIES.inc(status=error.resp.status)
+                throttled.clear()
+                backoff(attempt)
+                send(retry, False)
+            for i, error in throttled.items():
+                results[i] = {"error": str(error)}
+            throttled.clear()
+        except CalendarOverloaded as e:
+            # Earlier chunks are already in the calendar; report them and
+            # fail only what was never sent.
+            for i in range(offset, len(events)):
+                if results[i] is None:
+                    results[i] = {"error": str(e)}
+            break
+        except Exception as e:
+            for i in chunk:
+                if results[i] is None:
+                    results[i] = {"error": str(e)}
+            throttled.clear()
+    _reads.forget((user_key(token),))
+    return results
+
+
+async def run_blocking(func, *args, user):
+    """Run a blocking Calendar call for `user` on the shared executor.
+
+    The call counts against the scheduler's queue limits while it waits for
+    a worker and is refused with CalendarOverloaded rather than queued
+    without bound.
+    """
+    pending = calendar_scheduler.enqueue(user)
+    # Carry the trace ID (and other context) into the worker thread.
+    ctx = contextvars.copy_context()
+
+    def run():
+        pending.start()
+        return ctx.run(func, *args)
+
+    future = _executor.submit(run)
+    future.add_done_callback(pending.finish)
+    return await asyncio.wrap_future(future)
+
+
+async def aget_busy_intervals(token: str, time_min: datetime, time_max: datetime, calendar_ids=None):
+    return await run_blocking(get_busy_intervals, token, time_min, time_max, calendar_ids, user=user_key(token))
+
+
+async def aget_events(token: str, time_min: datetime, time_max: datetime, calendar_ids=None):
+    return await run_blocking(get_events, token, time_min, time_max, calendar_ids, user=user_key(token))
+
+
+async def aget_busy_by_calendar(token: str, time_min: datetime, time_max: datetime, calendar_ids):
+    """get_busy_by_calendar for any number of calendars, chunks fetched concurrently."""
+    chunks = [calendar_ids[i:i + FREEBUSY_MAX_CALENDARS] for i in range(0, len(calendar_ids), FREEBUSY_MAX_CALENDARS)]
+    results = await asyncio.gather(*(
+        run_blocking(get_busy_by_calendar, token, time_min, time_max, chunk, user=user_key(token)) for chunk in chunks
+    ))
+    busy, unavailable = {}, []
+    for chunk_busy, chunk_unavailable in results:
+        busy.update(chunk_busy)
+        unavailable.extend(chunk_unavailable)
+    return busy, unavailable
+
+
+async def abook_event(summary, start_time, end_time, token: str):
+    return await run_blocking(book_event, summary, start_time, end_time, token, user=user_key(token))
+
+
+async def abook_events_batch(events, token: str):
+    return await run_blocking(book_events_batch, events, token, user=user_key(token))
@@ -0,0 +1,181 @@
+# agent/conflicts.py
+#
+# Conflict-checked booking. Each user gets an in-memory index of busy time
+# over the next few days, seeded from the Calendar API and updated on every
+# insert, so overlap checks are a bisect instead of a list call. Booking is
+# serialized per user so the check and the insert are atomic in-process;
+# seeding the index and waiting for rate-limit admission happen before the
+# lock is taken, so a throttled user never holds it while sleeping.
+
+import os
+import hashlib
+import threading
+from datetime import datetime, timedelta
+
+from cachetools import TTLCache
+
+from agent.availability import BusyIntervals
+from agent.calendar import book_event, book_events_batch, get_busy_intervals, reschedule_event, user_key
+from agent.rate_limit import calendar_scheduler
+from agent.slot_solver import find_free_slots, WORKING_HOURS
+
+INDEX_HORIZON_DAYS = int(os.getenv("BOOKING_INDEX_HORIZON_DAYS", "14"))
+# Re-seed from Google after this long so outside edits are picked up.
+INDEX_TTL = int(os.getenv("BOOKING_INDEX_TTL", "300"))
+BOOKING_LOCK_STRIPES = 256
+MAX_ALTERNATIVES = 3
+# How far past the requested time alternatives are looked for.
+ALTERNATIVES_SEARCH_DAYS = int(os.getenv("BOOKING_ALTERNATIVES_DAYS", "7"))
+
+
+class _UserIndex:
+    def __init__(self, busy, horizon_start, horizon_end):
+        self.busy = busy
+        self.horizon_start = horizon_start
+        self.horizon_end = horizon_end
+
+    def covers(self, start, end):
+        return self.horizon_start <= start and end <= self.horizon_end
+
+
+class BookingConflict(Exception):
+    """The requested time overlaps an existing event."""
+
+    def __init__(self, start, end, alternatives):
+        super().__init__(f"{start.isoformat()} – {end.isoformat()} overlaps an existing event")
+        self.start = start
+        self.end = end
+        self.alternatives = alternatives
+
+
+class ConflictGuard:
+    def __init__(self, horizon_days=INDEX_HORIZON_DAYS, ttl=INDEX_TTL):
+        self.horizon = timedelta(days=horizon_days)
+        self._indexes = TTLCache(maxsize=10000, ttl=ttl)
+        self._indexes_lock = threading.Lock()
+        # Striped so the lock table stays fixed-size however many users book.
+        self._locks = [threading.Lock() for _ in range(BOOKING_LOCK_STRIPES)]
+        self.stats = {"booked": 0, "rescheduled": 0, "conflicts": 0, "seeds": 0}
+
+    def _lock(self, key):
+        return self._locks[int(hashlib.sha256(key.encode()).hexdigest()[:8], 16) % len(self._locks)]
+
+    def _index(self, token, key, start, end):
+        """The user's index, (re)seeded if missing, stale, or not covering [start, end)."""
+        with self._indexes_lock:
+            index = self._indexes.get(key)
+        if index is not None and index.covers(start, end):
+            return index
+        horizon_start = min(start, datetime.now(start.tzinfo))
+        horizon_end = max(end, horizon_start + self.horizon)
+        seeded = get_busy_intervals(token, horizon_start, horizon_end)
+        # Copy: the seed may be a shared, coalesced result.
+        index = _UserIndex(BusyIntervals(seeded.intervals), horizon_start, horizon_end)
+        with self._indexes_lock:
+            # Seeding runs outside the booking lock; an index installed (and
+            # possibly booked into) meanwhile is newer than this read.
+            current = self._indexes.get(key)
+            if current is not None and current.covers(start, end):
+                return current
+            self._indexes[key] = index
+            self.stats["seeds"] += 1
+        return index
+
+    def seed(self, token, busy, horizon_start, horizon_end):
+        """Install busy intervals read elsewhere unless a fresh covering index exists."""
+        key = user_key(token)
+        with self._indexes_lock:
+            index = self._indexes.get(key)
+            if index is not None and index.covers(horizon_start, horizon_end):
+                return
+            self._indexes[key] = _UserIndex(BusyIntervals(busy.intervals), horizon_start, horizon_end)
+
+    def alternatives(self, busy, start, end, limit=MAX_ALTERNATIVES):
+        """Free start times (same duration) at or after the requested one.
+
+        Candidates step through each gap on the slot solver's grid and stay
+        inside working hours, so a long free evening yields several options
+        rather than one, and none of them at 3 AM.
+        """
+        duration = int((end - start).total_seconds() // 60)
+        until = start + timedelta(days=ALTERNATIVES_SEARCH_DAYS)
+        slots = find_free_slots({"me": busy.overlapping(start, until)}, start, until, duration,
+                                working_hours=WORKING_HOURS, max_results=limit)
+        return [slot_start for slot_start, _ in slots]
+
+    def book(self, summary, start, end, token, replaces=None):
+        """Insert the event unless it overlaps; raises BookingConflict with alternatives.
+
+        replaces is an earlier booking ({"id", "start", "end", "summary"}) to
+        move to [start, end), and retitle if summary differs, instead of
+        inserting a new event; its current time does not count as a
+        conflict. Returns the created or moved event.
+        """
+        key = user_key(token)
+        self._index(token, key, start, end)
+        calendar_scheduler.admit(key)
+        with self._lock(key):
+            index = self._index(token, key, start, end)
+            busy = index.busy
+            if replaces:
+                busy = BusyIntervals(busy.intervals)
+                busy.remove(datetime.fromisoformat(replaces["start"]), datetime.fromisoformat(replaces["end"]))
+            if not busy.is_free(start, end):
+                calendar_scheduler.refund(key)
+                self.stats["conflicts"] += 1
+                raise BookingConflict(start, end, self.alternatives(busy, start, end))
+            if replaces:
+                retitle = summary if summary != replaces.get("summary") else None
+                event = reschedule_event(replaces["id"], start.isoformat(), end.isoformat(), token,
+                                         admitted=True, summary=retitle)
+                index.busy = busy
+                self.stats["rescheduled"] += 1
+            else:
+                event = book_event(summary, start.isoformat(), end.isoformat(), token, admitted=True)
+                self.stats["booked"] += 1
+            index.busy.add(start, end)
+            return event
+
+    def book_many(self, events, token):
+        """Batch variant: events are (summary, start, end) datetimes.
+
+        Items that overlap the calendar, or an earlier item in the same
+        batch, come back as conflicts; the rest are inserted together.
+        """
+        key = user_key(token)
+        results = [None] * len(events)
+        if not events:
+            return results
+        lo = min(start for _, start, _ in events)
+        hi = max(end for _, _, end in events)
+        # As in book(): seed, and admit every item, before taking the lock;
+        # admissions for items that turn out to conflict are given back.
+        self._index(token, key, lo, hi)
+        calendar_scheduler.admit(key, len(events))
+        with self._lock(key):
+            index = self._index(token, key, lo, hi)
+            accepted = []
+            planned = BusyIntervals(index.busy.intervals)
+            for i, (summary, start, end) in enumerate(events):
+                if not planned.is_free(start, end):
+                    self.stats["conflicts"] += 1
+                    results[i] = {"error": "Conflicts with an existing event.",
+                                  "alternatives": [a.isoformat() for a in self.alternatives(planned, start, end)]}
+                    continue
+                planned.add(start, end)
+                accepted.append(i)
+            if len(accepted) < len(events):
+                calendar_scheduler.refund(key, len(events) - len(accepted))
+            if accepted:
+                outcomes = book_events_batch(
+                    [(events[i][0], events[i][1].isoformat(), events[i][2].isoformat()) for i in accepted],
+                    token, admitted=True)
+                for i, outcome in zip(accepted, outcomes):
+                    results[i] = outcome
+                    if "error" not in outcome:
+                        index.busy.add(events[i][1], events[i][2])
+                        self.stats["booked"] += 1
+        return results
+
+
+conflict_guard = ConflictGuard()
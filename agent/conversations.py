@@ -0,0 +1,117 @@
+# agent/conversations.py
+#
+# Durable multi-turn conversations. The graph is compiled with LangGraph's
+# SQLite checkpointer, one thread per conversation, so a turn starts from the
+# previous turn's intent, summary, start time and duration. Only the final
+# state of each turn is checkpointed (checkpoint_during=False), only the
+# newest CHECKPOINT_KEEP checkpoints of a thread are kept, and conversations
+# idle for CONVERSATION_TTL seconds (or beyond CONVERSATION_MAX_THREADS) are
+# deleted, so the file stays bounded however many conversations there are.
+# The user's OAuth token is never part of the graph state: it travels in
+# token_var beside it, so no checkpoint can hold it, even one written
+# after a node raised.
+
+import os
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+CONVERSATIONS_ENABLED = os.getenv("CONVERSATIONS", "1") == "1"
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", "checkpoints.sqlite3")
+CHECKPOINT_KEEP = int(os.getenv("CHECKPOINT_KEEP", "1"))
+CONVERSATION_TTL = int(os.getenv("CONVERSATION_TTL", str(24 * 3600)))
+CONVERSATION_MAX_THREADS = int(os.getenv("CONVERSATION_MAX_THREADS", "100000"))
+PRUNE_EVERY = 256
+
+# The calendar token for the turn being run; nodes read it, callers set it.
+token_var = ContextVar("calendar_token", default="")
+
+
+@asynccontextmanager
+async def open_checkpointer(path=CHECKPOINT_PATH):
+    """AsyncSqliteSaver on `path` (WAL), or None when conversations are disabled."""
+    if not CONVERSATIONS_ENABLED:
+        yield None
+        return
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+    async with AsyncSqliteSaver.from_conn_string(path) as saver:
+        await saver.conn.execute("PRAGMA journal_mode=WAL")
+        await saver.conn.execute("PRAGMA synchronous=NORMAL")
+        await saver.setup()
+        await saver.conn.execute(
+            "CREATE TABLE IF NOT EXISTS conversation_activity ("
+            "thread_id TEXT PRIMARY KEY, updated_at REAL NOT NULL)"
+        )
+        await saver.conn.execute(
+            "CREATE INDEX IF NOT EXISTS conversation_activity_by_time ON conversation_activity (updated_at)"
+        )
+        await saver.conn.commit()
+        yield saver
+
+
+def thread_config(thread_id):
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def turn_state(message, trace_id):
+    """Graph input for one turn.
+
+    Only the per-turn keys are sent; with a checkpointer the rest (intent,
+    summary, start_time, ...) comes from the thread's last checkpoint, and
+    without one the nodes start from their defaults. The token goes in
+    token_var.
+    """
+    return {"input": message, "output": "", "trace_id": trace_id}
+
+
+class ConversationPruner:
+    def __init__(self, keep=CHECKPOINT_KEEP, ttl=CONVERSATION_TTL, max_threads=CONVERSATION_MAX_THREADS):
+        self.keep = keep
+        self.ttl = ttl
+        self.max_threads = max_threads
+        self.stats = {"turns": 0, "expired_threads": 0}
+
+    async def after_turn(self, saver, thread_id):
+        """Trim the thread to its newest checkpoints; now and then drop idle threads."""
+        if saver is None:
+            return
+        conn = saver.conn
+        async with saver.lock:
+            await conn.execute(
+                "DELETE FROM checkpoints WHERE thread_id=? AND checkpoint_id NOT IN ("
+                "SELECT checkpoint_id FROM checkpoints WHERE thread_id=? ORDER BY checkpoint_id DESC LIMIT ?)",
+                (thread_id, thread_id, self.keep),
+            )
+            await conn.execute(
+                "DELETE FROM writes WHERE thread_id=? AND checkpoint_id NOT IN ("
+                "SELECT checkpoint_id FROM checkpoints WHERE thread_id=?)",
+                (thread_id, thread_id),
+            )
+            await conn.execute(
+                "INSERT OR REPLACE INTO conversation_activity VALUES (?, ?)", (thread_id, time.time())
+            )
+            await conn.commit()
+        self.stats["turns"] += 1
+        if self.stats["turns"] % PRUNE_EVERY == 0:
+            await self._expire(saver)
+
+    async def _expire(self, saver):
+        conn = saver.conn
+        async with conn.execute(
+            "SELECT thread_id FROM conversation_activity WHERE updated_at <= ? OR thread_id IN ("
+            "SELECT thread_id FROM conversation_activity ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+            (time.time() - self.ttl, self.max_threads),
+        ) as cursor:
+            expired = [row[0] for row in await cursor.fetchall()]
+        for thread_id in expired:
+            await saver.adelete_thread(thread_id)
+        if expired:
+            async with saver.lock:
+                await conn.executemany(
+                    "DELETE FROM conversation_activity WHERE thread_id=?", [(t,) for t in expired])
+                await conn.commit()
+            self.stats["expired_threads"] += len(expired)
+
+
+conversation_pruner = ConversationPruner()
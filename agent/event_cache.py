@@ -0,0 +1,285 @@
+# agent/event_cache.py
+
+import os
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from googleapiclient.errors import HttpError
+
+from agent.availability import is_busy
+from agent.recurrence import expand_master, override_key
+
+EVENT_CACHE_PATH = os.getenv("EVENT_CACHE_PATH", "event_cache.sqlite3")
+# Seconds a synced calendar may be served locally before re-syncing.
+EVENT_CACHE_MAX_STALENESS = float(os.getenv("EVENT_CACHE_MAX_STALENESS", "60"))
+# The store only holds events ending after now minus this many days; older
+# windows are answered by freebusy instead.
+EVENT_CACHE_LOOKBACK_DAYS = float(os.getenv("EVENT_CACHE_LOOKBACK_DAYS", "1"))
+
+IST = timezone(timedelta(hours=5, minutes=30))
+
+# Partial-response mask for event listings: only what availability and
+# conflict checks read (the user's own RSVP, so declined events stay free).
+# Keeps pages small however much detail events carry.
+EVENT_FIELDS = "id,summary,start,end,status,transparency,attendees(self,responseStatus)"
+# With local recurrence the listing also carries series rules and exception links.
+RECURRENCE_FIELDS = EVENT_FIELDS + ",recurrence,recurringEventId,originalStartTime,updated"
+
+# Bumped whenever cached rows would be read differently; the file is only a
+# cache, so an old one is dropped and resynced.
+SCHEMA_VERSION = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    user_key    TEXT NOT NULL,
+    calendar_id TEXT NOT NULL,
+    event_id    TEXT NOT NULL,
+    start_ts    REAL NOT NULL,
+    end_ts      REAL NOT NULL,
+    busy        INTEGER NOT NULL,
+    body        TEXT NOT NULL,
+    PRIMARY KEY (user_key, calendar_id, event_id)
+);
+-- Reads ask for end_ts > window start; with past events kept around, that is
+-- the selective bound (start_ts < window end matches the whole history).
+CREATE INDEX IF NOT EXISTS events_by_end ON events (user_key, calendar_id, end_ts, start_ts);
+-- Recurring series masters (local recurrence only), expanded at read time.
+CREATE TABLE IF NOT EXISTS recurring (
+    user_key    TEXT NOT NULL,
+    calendar_id TEXT NOT NULL,
+    event_id    TEXT NOT NULL,
+    body        TEXT NOT NULL,
+    PRIMARY KEY (user_key, calendar_id, event_id)
+);
+-- Modified or cancelled instances of a series, keyed by the instance ID the
+-- expansion would generate; they suppress that occurrence.
+CREATE TABLE IF NOT EXISTS exceptions (
+    user_key    TEXT NOT NULL,
+    calendar_id TEXT NOT NULL,
+    instance_id TEXT NOT NULL,
+    master_id   TEXT NOT NULL,
+    original_ts REAL NOT NULL,
+    body        TEXT NOT NULL,
+    PRIMARY KEY (user_key, calendar_id, instance_id)
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    user_key    TEXT NOT NULL,
+    calendar_id TEXT NOT NULL,
+    sync_token  TEXT,
+    synced_at   REAL NOT NULL,
+    expanded    INTEGER NOT NULL,
+    PRIMARY KEY (user_key, calendar_id)
+);
+"""
+
+_TABLES = ("events", "recurring", "exceptions", "sync_state")
+
+
+def event_bounds(event):
+    """(start_ts, end_ts) in epoch seconds; all-day events span IST midnights."""
+    def ts(part):
+        if "dateTime" in part:
+            return datetime.fromisoformat(part["dateTime"].replace("Z", "+00:00")).timestamp()
+        return datetime.fromisoformat(part["date"]).replace(tzinfo=IST).timestamp()
+    return ts(event["start"]), ts(event["end"])
+
+
+class EventStore:
+    """Per-user local copy of Calendar events kept fresh with syncToken.
+
+    Events live in SQLite (WAL, so readers never block the syncing writer)
+    indexed by (start, end); availability reads become an index range scan.
+    With local_recurrence the sync lists with singleEvents=False, so a
+    series is stored (and re-synced) once as its master instead of once per
+    instance, and reads expand masters over just the requested window.
+    """
+
+    def __init__(self, path=EVENT_CACHE_PATH, max_staleness=EVENT_CACHE_MAX_STALENESS, local_recurrence=False):
+        self.path = path
+        self.max_staleness = max_staleness
+        self.local_recurrence = local_recurrence
+        self._local = threading.local()
+        self._sync_locks = {}
+        self._sync_locks_guard = threading.Lock()
+        with self._conn() as conn:
+            if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                conn.executescript("".join(f"DROP TABLE IF EXISTS {table};" for table in _TABLES))
+                conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+            conn.executescript(_SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _sync_lock(self, user_key, calendar_id):
+        with self._sync_locks_guard:
+            return self._sync_locks.setdefault((user_key, calendar_id), threading.Lock())
+
+    # -- writes -----------------------------------------------------------
+
+    def upsert(self, user_key, calendar_id, event, conn=None):
+        conn = conn or self._conn()
+        key = (user_key, calendar_id, event["id"])
+        if self.local_recurrence and event.get("recurringEventId") and event.get("originalStartTime"):
+            instance, original = override_key(event)
+            conn.execute(
+                "INSERT OR REPLACE INTO exceptions VALUES (?, ?, ?, ?, ?, ?)",
+                (user_key, calendar_id, instance, event["recurringEventId"], original.timestamp(), json.dumps(event)),
+            )
+        if event.get("status") == "cancelled":
+            conn.execute("DELETE FROM events WHERE user_key=? AND calendar_id=? AND event_id=?", key)
+            if conn.execute("DELETE FROM recurring WHERE user_key=? AND calendar_id=? AND event_id=?", key).rowcount:
+                conn.execute("DELETE FROM exceptions WHERE user_key=? AND calendar_id=? AND master_id=?", key)
+            return
+        if event.get("recurrence"):
+            conn.execute("INSERT OR REPLACE INTO recurring VALUES (?, ?, ?, ?)", (*key, json.dumps(event)))
+            return
+        start_ts, end_ts = event_bounds(event)
+        busy = int(is_busy(event))
+        conn.execute(
+            "INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (user_key, calendar_id, event["id"], start_ts, end_ts, busy, json.dumps(event)),
+        )
+
+    def write_through(self, user_key, calendar_id, event):
+        """Record an event we just created so reads see it before the next sync."""
+        with self._conn() as conn:
+            self.upsert(user_key, calendar_id, event, conn)
+
+    # -- sync -------------------------------------------------------------
+
+    def _state(self, user_key, calendar_id):
+        return self._conn().execute(
+            "SELECT sync_token, synced_at, expanded FROM sync_state WHERE user_key=? AND calendar_id=?",
+            (user_key, calendar_id),
+        ).fetchone()
+
+    def is_fresh(self, user_key, calendar_id):
+        state = self._state(user_key, calendar_id)
+        return state is not None and time.time() - state[1] < self.max_staleness
+
+    @staticmethod
+    def horizon_start():
+        """Earliest time the store can answer for (epoch seconds)."""
+        return time.time() - EVENT_CACHE_LOOKBACK_DAYS * 86400
+
+    def covers(self, time_min):
+        return time_min.timestamp() >= self.horizon_start()
+
+    def sync(self, service, user_key, calendar_id="primary", execute=None):
+        """Bring the local copy up to date, incrementally when possible."""
+        execute = execute or (lambda request: request.execute())
+        with self._sync_lock(user_key, calendar_id):
+            if self.is_fresh(user_key, calendar_id):
+                return
+            state = self._state(user_key, calendar_id)
+            # A token from the other listing mode can't be continued.
+            sync_token = state[0] if state and bool(state[2]) == self.local_recurrence else None
+            try:
+                self._pull(service, user_key, calendar_id, sync_token, execute)
+            except HttpError as e:
+                if e.resp.status != 410:
+                    raise
+                # Sync token expired: drop everything and start over.
+                self._pull(service, user_key, calendar_id, None, execute)
+
+    def _pull(self, service, user_key, calendar_id, sync_token, execute):
+        conn = self._conn()
+        horizon = self.horizon_start()
+        with conn:
+            if sync_token is None:
+                for table in ("events", "recurring", "exceptions"):
+                    conn.execute(f"DELETE FROM {table} WHERE user_key=? AND calendar_id=?", (user_key, calendar_id))
+            else:
+                # Incremental syncs report changes at any date; keep the store
+                # to the same horizon the initial sync had. Series masters
+                # stay: their later occurrences are still ahead.
+                conn.execute(
+                    "DELETE FROM events WHERE user_key=? AND calendar_id=? AND end_ts <= ?",
+                    (user_key, calendar_id, horizon),
+                )
+                conn.execute(
+                    "DELETE FROM exceptions WHERE user_key=? AND calendar_id=? AND original_ts <= ?",
+                    (user_key, calendar_id, horizon - 86400),
+                )
+            page_token = None
+            mask = RECURRENCE_FIELDS if self.local_recurrence else EVENT_FIELDS
+            while True:
+                params = {
+                    "calendarId": calendar_id, "singleEvents": not self.local_recurrence, "maxResults": 2500,
+                    "fields": f"items({mask}),nextPageToken,nextSyncToken",
+                }
+                if sync_token:
+                    params["syncToken"] = sync_token
+                else:
+                    # Bounded full sync: not the whole calendar history.
+                    params["timeMin"] = datetime.fromtimestamp(horizon, timezone.utc).isoformat()
+                if page_token:
+                    params["pageToken"] = page_token
+                result = execute(service.events().list(**params))
+                for event in result.get("items", []):
+                    self.upsert(user_key, calendar_id, event, conn)
+                page_token = result.get("nextPageToken")
+                if not page_token:
+                    break
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?, ?, ?)",
+                (user_key, calendar_id, result.get("nextSyncToken"), time.time(), int(self.local_recurrence)),
+            )
+
+    # -- reads ------------------------------------------------------------
+
+    def _occurrences(self, user_key, calendar_id, time_min, time_max):
+        """Instances of the stored series overlapping [time_min, time_max).
+
+        Raises ValueError/TypeError from recurrence parsing; callers fall
+        back to asking Google.
+        """
+        conn = self._conn()
+        masters = conn.execute(
+            "SELECT body FROM recurring WHERE user_key=? AND calendar_id=?", (user_key, calendar_id)
+        ).fetchall()
+        if not masters:
+            return []
+        overrides = {instance: json.loads(body) for instance, body in conn.execute(
+            "SELECT instance_id, body FROM exceptions WHERE user_key=? AND calendar_id=?", (user_key, calendar_id)
+        )}
+        occurrences = []
+        for (body,) in masters:
+            occurrences.extend(expand_master(json.loads(body), time_min, time_max, overrides))
+        return occurrences
+
+    def busy_intervals(self, user_key, calendar_id, time_min, time_max):
+        rows = self._conn().execute(
+            "SELECT start_ts, end_ts FROM events WHERE user_key=? AND calendar_id=? "
+            "AND busy=1 AND start_ts < ? AND end_ts > ? ORDER BY start_ts",
+            (user_key, calendar_id, time_max.timestamp(), time_min.timestamp()),
+        ).fetchall()
+        if self.local_recurrence:
+            rows += [event_bounds(e) for e in self._occurrences(user_key, calendar_id, time_min, time_max)
+                     if is_busy(e)]
+            rows.sort()
+        return [
+            (datetime.fromtimestamp(s, timezone.utc), datetime.fromtimestamp(e, timezone.utc))
+            for s, e in rows
+        ]
+
+    def events(self, user_key, calendar_id, time_min, time_max):
+        rows = self._conn().execute(
+            "SELECT body FROM events WHERE user_key=? AND calendar_id=? "
+            "AND start_ts < ? AND end_ts > ? ORDER BY start_ts",
+            (user_key, calendar_id, time_max.timestamp(), time_min.timestamp()),
+        ).fetchall()
+        events = [json.loads(body) for (body,) in rows]
+        if self.local_recurrence:
+            events += self._occurrences(user_key, calendar_id, time_min, time_max)
+            events.sort(key=lambda e: event_bounds(e)[0])
+        return events
@@ -0,0 +1,254 @@
+# agent/fast_parser.py
+#
+# Rule-based intent/time extraction for the common phrasings ("book a
+# meeting at 3pm for 30 minutes", "am I free tomorrow?"). It returns the
+# same JSON-shaped dict the model would, or None whenever anything in the
+# message is not understood, in which case the caller asks the model.
+
+import re
+import threading
+from datetime import datetime, timedelta
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+SUMMARY_WORDS = {
+    "meeting": "Meeting", "call": "Call", "appointment": "Appointment",
+    "standup": "Standup", "sync": "Sync", "interview": "Interview", "lunch": "Lunch",
+}
+
+BOOKING_RE = re.compile(r"\b(book|schedule|set up|create|add)\b")
+CHECK_RE = re.compile(r"\b(am i (free|available|busy)|free|available|busy|my schedule|what'?s on|what is on)\b")
+# Check phrasings that ask for the events themselves rather than free/busy.
+SCHEDULE_RE = re.compile(r"\b(my schedule|what'?s on|what is on)\b")
+DAY_RE = re.compile(r"\b(day after tomorrow|today|tonight|tomorrow|(?:next |this |on )?(?:" + "|".join(WEEKDAYS) + r"))\b")
+TIME_12H_RE = re.compile(r"\b(\d{1,2})(?::(\d{2}))?\s*(am|pm|a\.m\.?|p\.m\.?)")
+TIME_24H_RE = re.compile(r"\b([01]?\d|2[0-3]):([0-5]\d)\b")
+NOON_RE = re.compile(r"\bnoon\b")
+DURATION_RE = re.compile(
+    r"\b(?:for\s+)?(?:(half an hour|half hour|an hour|one hour)|(\d+(?:\.\d+)?)\s*(minutes?|mins?|hours?|hrs?))\b"
+)
+
+# Words that may remain once every recognised phrase is removed. Anything
+# else (names, places, "with", "about", ...) means low confidence.
+FILLER = {
+    "a", "an", "the", "for", "at", "on", "in", "me", "my", "please", "can", "could",
+    "you", "i", "am", "is", "are", "be", "do", "have", "any", "anything", "calendar",
+    "new", "slot", "time", "from", "of", "to", "will", "would", "like", "want",
+    "book", "schedule", "set", "up", "create", "add", "free", "available", "busy",
+    "what", "whats", "what's", "schedule", "hey", "hi", "there", "it",
+} | set(SUMMARY_WORDS)
+
+# Extra words allowed in a follow-up that only changes the time, day or length
+# of the previous request ("make it an hour instead", "what about thursday?").
+FOLLOWUP_FILLER = FILLER | {
+    "make", "change", "move", "push", "extend", "shorten", "instead", "actually", "rather",
+    "how", "about", "and", "then", "ok", "okay", "no", "sorry", "same", "but", "that",
+}
+
+_stats = {"hits": 0, "misses": 0}
+_stats_lock = threading.Lock()
+
+
+def fast_path_stats():
+    with _stats_lock:
+        total = _stats["hits"] + _stats["misses"]
+        return {**_stats, "hit_rate": _stats["hits"] / total if total else 0.0}
+
+
+def _count(hit):
+    with _stats_lock:
+        _stats["hits" if hit else "misses"] += 1
+
+
+def _resolve_day(phrase, now_ist):
+    """Date for a day phrase, or None when it's ambiguous."""
+    if phrase in ("today", "tonight"):
+        return now_ist.date()
+    if phrase == "tomorrow":
+        return (now_ist + timedelta(days=1)).date()
+    if phrase == "day after tomorrow":
+        return (now_ist + timedelta(days=2)).date()
+    words = phrase.split()
+    target = WEEKDAYS.index(words[-1])
+    ahead = (target - now_ist.weekday()) % 7
+    if ahead == 0:
+        # "Monday" said on a Monday could mean today or next week.
+        if words[0] != "next":
+            return None
+        ahead = 7
+    return (now_ist + timedelta(days=ahead)).date()
+
+
+def _parse_time(text):
+    """(hour, minute, remaining_text) or (None, None, text); "ambiguous" on conflicts."""
+    found = []
+    for m in TIME_12H_RE.finditer(text):
+        hour, minute = int(m.group(1)), int(m.group(2) or 0)
+        if not 1 <= hour <= 12 or minute > 59:
+            return "ambiguous", None, text
+        hour = hour % 12 + (12 if m.group(3).startswith("p") else 0)
+        found.append((hour, minute, m))
+    if not found:
+        for m in TIME_24H_RE.finditer(text):
+            found.append((int(m.group(1)), int(m.group(2)), m))
+    if not found:
+        for m in NOON_RE.finditer(text):
+            found.append((12, 0, m))
+    if len(found) > 1:
+        return "ambiguous", None, text
+    if not found:
+        return None, None, text
+    hour, minute, m = found[0]
+    return hour, minute, text[:m.start()] + " " + text[m.end():]
+
+
+def _parse_duration(text):
+    matches = list(DURATION_RE.finditer(text))
+    if len(matches) > 1:
+        return "ambiguous", text
+    if not matches:
+        return None, text
+    m = matches[0]
+    if re.search(r"\bin\s*$", text[:m.start()]):
+        return "ambiguous", text  # "in 2 hours" is a time from now, not a length
+    if m.group(1):
+        minutes = 30 if m.group(1).startswith("half") else 60
+    else:
+        value = float(m.group(2))
+        minutes = value * 60 if m.group(3).startswith(("hour", "hr")) else value
+    if minutes <= 0 or minutes != int(minutes):
+        return "ambiguous", text
+    return int(minutes), text[:m.start()] + " " + text[m.end():]
+
+
+def _parse(user_input, now_ist):
+    text = user_input.lower().strip()
+    text = re.sub(r"[?!,.]+(\s|$)", r" ", text)
+
+    is_booking = bool(BOOKING_RE.search(text))
+    is_check = bool(CHECK_RE.search(text)) and not is_booking
+    is_schedule = is_check and bool(SCHEDULE_RE.search(text))
+    if not (is_booking or is_check):
+        return None
+
+    hour, minute, text = _parse_time(text)
+    if hour == "ambiguous":
+        return None
+    duration, text = _parse_duration(text)
+    if duration == "ambiguous":
+        return None
+
+    days = DAY_RE.findall(text)
+    if len(days) > 1:
+        return None
+    day = _resolve_day(days[0], now_ist) if days else None
+    if days and day is None:
+        return None
+    text = DAY_RE.sub(" ", text)
+
+    leftover = [w for w in re.split(r"\s+", text) if w and w not in FILLER]
+    if leftover:
+        return None
+
+    summary = next((SUMMARY_WORDS[w] for w in text.split() if w in SUMMARY_WORDS), "Meeting")
+    clock = f"{hour:02d}:{minute:02d}" if hour is not None else ""
+
+    if is_booking:
+        if not clock:
+            return None  # a booking without a time needs the model (or the user) anyway
+        start_time = f"{day.isoformat()}T{clock}:00" if day else clock
+        return {
+            "intent": "booking",
+            "summary": summary,
+            "start_time": start_time,
+            "end_time": "",
+            "duration_minutes": duration or 30,
+        }
+
+    # Availability: a specific slot, a whole day, or (neither) the next 24h.
+    if clock:
+        start_time = f"{day.isoformat()}T{clock}:00" if day else clock
+        end_dt = now_ist.replace(hour=hour, minute=minute) + timedelta(minutes=duration or 30)
+        end_time = end_dt.strftime("%H:%M")
+    elif day:
+        # For today only the remaining hours matter.
+        start_time = now_ist.replace(second=0, microsecond=0).isoformat() if day == now_ist.date() else f"{day.isoformat()}T00:00:00"
+        end_time = f"{(day + timedelta(days=1)).isoformat()}T00:00:00"
+    else:
+        start_time, end_time = "", ""
+    return {
+        "intent": "query_schedule" if is_schedule else "check_availability",
+        "summary": "",
+        "start_time": start_time,
+        "end_time": end_time,
+        "duration_minutes": duration or 30,
+    }
+
+
+def fast_parse(user_input, now_ist):
+    """Model-shaped intent dict for a high-confidence message, else None."""
+    parsed = _parse(user_input, now_ist)
+    _count(parsed is not None)
+    return parsed
+
+
+def fast_parse_followup(user_input, previous, now_ist):
+    """Apply a short follow-up to the previous request's fields, or None.
+
+    Handles changes of length ("make it an hour") to a booking, and of
+    day ("what about Thursday?") or time ("how about 4pm") to a booking,
+    availability or schedule question. Anything that reads like a new request, or that
+    isn't fully understood, returns None.
+    """
+    text = user_input.lower().strip()
+    text = re.sub(r"[?!,.]+(\s|$)", r" ", text)
+    if BOOKING_RE.search(text) or CHECK_RE.search(text):
+        return None
+    if previous.get("intent") not in ("booking", "check_availability", "query_schedule"):
+        return None
+
+    hour, minute, text = _parse_time(text)
+    duration, text = _parse_duration(text)
+    days = DAY_RE.findall(text)
+    if hour == "ambiguous" or duration == "ambiguous" or len(days) > 1:
+        return None
+    day = _resolve_day(days[0], now_ist) if days else None
+    if (days and day is None) or (hour is None and duration is None and day is None):
+        return None
+    text = DAY_RE.sub(" ", text)
+    if any(w and w not in FOLLOWUP_FILLER for w in re.split(r"\s+", text)):
+        return None
+
+    parsed = {k: previous.get(k) for k in ("intent", "summary", "start_time", "end_time", "duration_minutes")}
+    if duration is not None:
+        parsed["duration_minutes"] = duration
+    if hour is None and day is None:
+        if parsed["intent"] != "booking":
+            return None  # a length alone doesn't say which window to look at
+        return parsed
+
+    if parsed["start_time"]:
+        prev_start = datetime.fromisoformat(parsed["start_time"])
+    else:
+        prev_start = None
+    if parsed["intent"] == "booking" or hour is not None:
+        if hour is None:
+            if prev_start is None:
+                return None
+            hour, minute = prev_start.hour, prev_start.minute
+        date = day or (prev_start.date() if prev_start else None)
+        clock = f"{hour:02d}:{minute:02d}"
+        parsed["start_time"] = f"{date.isoformat()}T{clock}:00" if date else clock
+        if parsed["intent"] != "booking":
+            start = now_ist.replace(hour=hour, minute=minute) if date is None else \
+                datetime.fromisoformat(parsed["start_time"])
+            parsed["end_time"] = (start + timedelta(minutes=parsed["duration_minutes"] or 30)).strftime(
+                "%H:%M" if date is None else "%Y-%m-%dT%H:%M:%S")
+        else:
+            parsed["end_time"] = ""
+        return parsed
+
+    # Availability moved to another day: the whole of that day.
+    parsed["start_time"] = now_ist.replace(second=0, microsecond=0).isoformat() if day == now_ist.date() \
+        else f"{day.isoformat()}T00:00:00"
+    parsed["end_time"] = f"{(day + timedelta(days=1)).isoformat()}T00:00:00"
+    return parsed
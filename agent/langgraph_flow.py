@@ -2,40 +2,104 @@
 
 import os
 import json
+import asyncio
 from datetime import datetime, timedelta, timezone 
-import traceback
+import logging
+import threading
 from typing import TypedDict, Literal
 
 from dotenv import load_dotenv
-from langgraph.graph import StateGraph
-from langchain.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnableLambda
-from langchain_google_genai import ChatGoogleGenerativeAI
-from agent.token_store import stored_token
-
-
-from .calendar import check_availability, book_event
+from pydantic import BaseModel, Field
+
+# langgraph/langchain/langchain_google_genai are imported where first used
+# (get_model, get_prompt, langgraph_agent) so importing this module stays cheap.
+
+from .logs import fields
+from .fast_parser import fast_parse, fast_parse_followup
+from .metrics import observe_dependency, timed_node, atimed_node, trace_id_var, registry, Counter
+from .llm_cache import llm_cache, cache_key
+from .calendar import get_busy_intervals, aget_busy_intervals, aget_busy_by_calendar, run_blocking, user_key
+from .calendar import get_events, aget_events
+from .calendar import get_busy_by_calendar, FREEBUSY_MAX_CALENDARS
+from .rate_limit import CalendarOverloaded
+from .conflicts import conflict_guard, BookingConflict
+from .slot_solver import find_free_slots, WORKING_HOURS
+from .prefetch import cancel_prefetch, prefetched_busy, seed_booking_index
+from .model_router import model_router, MODEL_DEADLINE
+from .conversations import token_var
 
 load_dotenv()
 
-model = ChatGoogleGenerativeAI(
-    model="models/gemini-1.5-pro-latest",
-    google_api_key=os.getenv("GEMINI_API_KEY")
-)
+log = logging.getLogger(__name__)
+
+model = None
+fallback_model = None
+prompt = None
+_init_lock = threading.Lock()
+
+# "json": free-text prompt asking for raw JSON, parsed with json.loads.
+# "structured": short prompt + the model's schema-constrained output (IntentFields).
+INTENT_OUTPUT = os.getenv("INTENT_OUTPUT", "json")
+# Cheaper/faster model for hedged requests and for when the primary's breaker is open.
+FALLBACK_MODEL = os.getenv("FALLBACK_MODEL", "")
+# The router enforces the overall deadline; this only bounds a single HTTP attempt.
+MODEL_MAX_RETRIES = int(os.getenv("MODEL_MAX_RETRIES", "1"))
+
+INTENT_PARSE_FAILURES = registry.register(Counter(
+    "intent_parse_failures_total", "Model answers that could not be parsed into intent fields.", ("mode",)))
+
+
+def get_model():
+    """The shared chat model, created on first use (or by the app lifespan)."""
+    global model
+    if model is None:
+        with _init_lock:
+            if model is None:
+                from langchain_google_genai import ChatGoogleGenerativeAI
+                model = ChatGoogleGenerativeAI(
+                    model="models/gemini-1.5-pro-latest",
+                    google_api_key=os.getenv("GEMINI_API_KEY"),
+                    timeout=MODEL_DEADLINE,
+                    max_retries=MODEL_MAX_RETRIES,
+                )
+    return model
+
+
+def get_fallback_model():
+    """FALLBACK_MODEL, created on first use; None when not configured."""
+    global fallback_model
+    if fallback_model is None and FALLBACK_MODEL:
+        with _init_lock:
+            if fallback_model is None:
+                from langchain_google_genai import ChatGoogleGenerativeAI
+                fallback_model = ChatGoogleGenerativeAI(
+                    model=FALLBACK_MODEL,
+                    google_api_key=os.getenv("GEMINI_API_KEY"),
+                    timeout=MODEL_DEADLINE,
+                    max_retries=MODEL_MAX_RETRIES,
+                )
+    return fallback_model
 
 class AgentState(TypedDict):
+    # The calendar token is not here; nodes read it from token_var.
     input: str
-    token: str
-    intent: Literal["booking", "check_availability", "error", "unknown"]
+    intent: Literal["booking", "check_availability", "query_schedule", "find_slot", "error", "unknown"]
     summary: str
     start_time: str
+    end_time: str
+    attendees: list
     duration_minutes: int
     output: str
+    trace_id: str
+    # The event the last booking turn created ({"id", "start", "end",
+    # "summary"}), and the one this turn's follow-up moves instead of
+    # booking anew.
+    booked: dict
+    replaces: dict
 
 # Define prompt template
 
-prompt = ChatPromptTemplate.from_template(
-    """You are a helpful assistant for processing calendar booking requests.
+PROMPT_TEMPLATE = """You are a helpful assistant for processing calendar booking requests.
 The current date is {current_date} and the current time is {current_time}.
 The current timezone is Asia/Kolkata (IST).
 
@@ -44,7 +108,7 @@ User query: {user_input}
 Respond with only a valid JSON object. Do not include any markdown, text, or backticks.
 
 The JSON must contain:
-- "intent": one of "booking", "check_availability", or "query_schedule"
+- "intent": one of "booking", "check_availability", "query_schedule", or "find_slot" (the user wants you to find a time that works, possibly for several people)
 - "summary": short event title (if booking). If the user does not provide a specific title, use a default like "Meeting" or "Appointment".
 - "start_time": ISO format datetime (e.g., "YYYY-MM-DDTHH:MM:SS").
   - **Prioritize the current date for bookings unless explicitly stated otherwise.**
@@ -53,171 +117,713 @@ The JSON must contain:
   - If the user specifies "today" or a similar phrase, use {current_date}.
   - If the user specifies a day (e.g., "tomorrow", "Tuesday", "next Monday"), infer the correct date.
 - "duration_minutes": integer, default 30 if not mentioned.
+- "end_time": for availability and schedule questions and find_slot, ISO end of the window asked about (e.g. end of the day for "am I free tomorrow", end of Friday for "this week"); empty string otherwise.
+- "attendees": for find_slot, a list of the other people's email addresses exactly as written; empty list otherwise.
+- "reschedule": true only if the user is changing the previous request's booking (e.g. "move it to 4pm", "make it an hour") rather than asking for another event; false otherwise.
 
 Respond with only this JSON object — no commentary, no formatting, no extra characters.
 """
-)
 
 
-def handle_input(state):
-    try:
-        state.setdefault("intent", "unknown")
-        state.setdefault("output", "")
+# The schema carries the field descriptions, so the structured prompt only
+# needs the context and the date rules.
+STRUCTURED_PROMPT_TEMPLATE = """Extract a calendar request. Now: {current_date} {current_time} Asia/Kolkata.
+Bare times mean today if still ahead, else tomorrow. Default duration 30.
+Request: {user_input}"""
+
+
+class IntentFields(BaseModel):
+    """The intent fields of AgentState, as the model should fill them."""
+
+    intent: Literal["booking", "check_availability", "query_schedule", "find_slot", "unknown"] = Field(
+        description="query_schedule: list the user's events; find_slot: find a time that works, possibly for several people")
+    summary: str = Field("", description="event title for bookings, default \"Meeting\"")
+    start_time: str = Field("", description="ISO datetime YYYY-MM-DDTHH:MM:SS")
+    end_time: str = Field("", description="ISO end of the window for availability/find_slot, else empty")
+    duration_minutes: int = 30
+    attendees: list[str] = Field(default_factory=list, description="other people's emails for find_slot")
+    reschedule: bool = Field(False, description="true if changing the previous booking rather than adding another")
+
+
+def get_prompt():
+    global prompt
+    if prompt is None:
+        with _init_lock:
+            if prompt is None:
+                from langchain_core.prompts import ChatPromptTemplate
+                prompt = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
+    return prompt
+
+
+_chains = {}
+
+
+def get_chain(mode=None, fallback=False):
+    """prompt | model for `mode` (default INTENT_OUTPUT), composed once per model.
+
+    Keyed on the model object so swapping flow.model (benchmarks) rebuilds it.
+    With fallback=True the fallback model is used, or None if there is none.
+    """
+    mode = mode or INTENT_OUTPUT
+    llm = get_fallback_model() if fallback else get_model()
+    if llm is None:
+        return None
+    entry = _chains.get((mode, fallback))
+    if entry is None or entry[0] is not llm:
+        if mode == "structured":
+            from langchain_core.prompts import ChatPromptTemplate
+            chain = ChatPromptTemplate.from_template(STRUCTURED_PROMPT_TEMPLATE) | \
+                llm.with_structured_output(IntentFields, include_raw=True)
+        else:
+            chain = get_prompt() | llm
+        # Racing builders produce equivalent chains; last one wins.
+        entry = _chains[(mode, fallback)] = (llm, chain)
+    return entry[1]
+
+
+IST = timezone(timedelta(hours=5, minutes=30))
+
+
+# In a checkpointed conversation the state a turn starts from still holds the
+# previous turn's request; these fields are what a follow-up can refer to.
+CARRY_OVER_INTENTS = {"booking", "check_availability", "query_schedule", "find_slot"}
+CARRY_OVER_FIELDS = ("intent", "summary", "start_time", "end_time", "duration_minutes", "attendees")
 
-        # Get current time for context
-        ist_timezone = timezone(timedelta(hours=5, minutes=30))
-        now_ist = datetime.now(ist_timezone)
-        current_date_str = now_ist.strftime("%Y-%m-%d")
-        current_time_str = now_ist.strftime("%H:%M:%S")
 
-        chain = prompt | model
-        response = chain.invoke({
-            "user_input": state["input"],
-            "current_date": current_date_str,
-            "current_time": current_time_str
-        })
+def _previous_request(state):
+    if state.get("intent") not in CARRY_OVER_INTENTS:
+        return None
+    # An availability window has no meeting length; carrying the default 30
+    # would let "make it an hour" shrink the window to its first hour.
+    return {k: state.get(k) for k in CARRY_OVER_FIELDS
+            if state.get(k) and (k != "duration_minutes" or state.get("intent") == "booking")}
 
-        print("🔍 Raw model output:", response.content)
 
+def _replaced_booking(state, parsed):
+    """The booking this turn moves, or {} to book anew.
+
+    `state` still holds the previous turn. Only a booking that follows a
+    booking turn moves it, and only when it says so: the fast parser
+    matched it as a follow-up, or the model set "reschedule".
+    """
+    if state.get("intent") != "booking" or parsed.get("intent") != "booking" or parsed.get("reschedule") is not True:
+        return {}
+    return state.get("booked") or {}
+
+
+def _fast_path(message, previous, now_ist):
+    if previous is not None:
+        parsed = fast_parse_followup(message, previous, now_ist)
+        if parsed is not None:
+            return {**parsed, "reschedule": parsed["intent"] == "booking"}
+    return fast_parse(message, now_ist)
+
+
+def _model_input(message, previous):
+    """The message, plus the previous request's fields (not the transcript) for follow-ups."""
+    if previous is None:
+        return message
+    return f"{message}\n(Previous request, for follow-ups: {json.dumps(previous, separators=(',', ':'))})"
+
+
+def _prompt_inputs(state, now_ist, previous=None):
+    return {
+        "user_input": _model_input(state["input"], previous),
+        "current_date": now_ist.strftime("%Y-%m-%d"),
+        "current_time": now_ist.strftime("%H:%M:%S")
+    }
+
+
+def _resolve_start(value, now_ist):
+    """Datetime for a start_time string: full ISO, or a bare clock time rolled to the next occurrence."""
+    ist_timezone = IST
+    current_date_str = now_ist.strftime("%Y-%m-%d")
+    inferred_start_dt = None
+
+    try:
+        # Attempt 1: Parse as full ISO datetime (e.g., "2025-07-01T10:00:00")
+        inferred_start_dt = datetime.fromisoformat(value)
+        if inferred_start_dt.tzinfo is None:
+            inferred_start_dt = inferred_start_dt.replace(tzinfo=ist_timezone)
+
+    except ValueError:
+        # Attempt 2: If full ISO fails, try to parse as just time (e.g., "10:00:00" or "10:00")
+        time_part = None
         try:
-            parsed = json.loads(response.content)
-        except json.JSONDecodeError as e:
-            return {
-                **state,
-                "intent": "error",
-                "output": f"❌ JSON parse error: {e}\nRaw response: {response.content}"
-            }
-
-        extracted_summary = parsed.get("summary", "")
-        if not extracted_summary and parsed.get("intent") == "booking":
-            extracted_summary = "Meeting" # Default summary if model doesn't provide one
-
-        # Handle start_time parsing and date inference
-        start_time_from_model = parsed.get("start_time", "")
-        inferred_start_dt = None
-
-        if start_time_from_model:
+            time_part = datetime.strptime(value, "%H:%M:%S").time()
+        except ValueError:
             try:
-                # Attempt 1: Parse as full ISO datetime (e.g., "2025-07-01T10:00:00")
-                inferred_start_dt = datetime.fromisoformat(start_time_from_model)
-                if inferred_start_dt.tzinfo is None:
-                    inferred_start_dt = inferred_start_dt.replace(tzinfo=ist_timezone)
-
+                time_part = datetime.strptime(value, "%H:%M").time()
             except ValueError:
-                # Attempt 2: If full ISO fails, try to parse as just time (e.g., "10:00:00" or "10:00")
-                time_part = None
-                try:
-                    time_part = datetime.strptime(start_time_from_model, "%H:%M:%S").time()
-                except ValueError:
-                    try:
-                        time_part = datetime.strptime(start_time_from_model, "%H:%M").time()
-                    except ValueError:
-                        # Model provided something completely unparseable, 'inferred_start_dt' remains None
-                        pass
-
-                if time_part:
-                    # Construct datetime for TODAY with the parsed time
-                    inferred_start_dt = now_ist.replace(
-                        hour=time_part.hour,
-                        minute=time_part.minute,
-                        second=time_part.second,
-                        microsecond=0
-                    )
-
-                    # LOGIC REFINEMENT HERE:
-                    # If the inferred time is *before or equal to* the current time,
-                    # and the user did NOT explicitly say "today", assume it's for tomorrow.
-                    # This prevents booking meetings in the immediate past of the current day.
-                    # We need to be careful if user says "book for today at 9PM" and it's 9:20PM.
-                    # Let's simplify and just say: if the time is already past on *this* date, push to tomorrow.
-                    if inferred_start_dt < now_ist:
-                        inferred_start_dt += timedelta(days=1)
-                        print(f"DEBUG: Inferred time {inferred_start_dt.strftime('%H:%M')} for today ({current_date_str}) is in the past ({now_ist.strftime('%H:%M')}), setting for tomorrow.")
-
-                    inferred_start_dt = inferred_start_dt.astimezone(ist_timezone) # Ensure IST timezone
-
-
-        # Fallback to an empty string if no valid datetime could be inferred, or convert to ISO
-        final_start_time_iso = inferred_start_dt.isoformat() if inferred_start_dt else ""
+                # Model provided something completely unparseable, 'inferred_start_dt' remains None
+                pass
+
+        if time_part:
+            # Construct datetime for TODAY with the parsed time
+            inferred_start_dt = now_ist.replace(
+                hour=time_part.hour,
+                minute=time_part.minute,
+                second=time_part.second,
+                microsecond=0
+            )
+
+            # LOGIC REFINEMENT HERE:
+            # If the inferred time is *before or equal to* the current time,
+            # and the user did NOT explicitly say "today", assume it's for tomorrow.
+            # This prevents booking meetings in the immediate past of the current day.
+            # We need to be careful if user says "book for today at 9PM" and it's 9:20PM.
+            # Let's simplify and just say: if the time is already past on *this* date, push to tomorrow.
+            if inferred_start_dt < now_ist:
+                inferred_start_dt += timedelta(days=1)
+                log.debug("start_rolled_to_tomorrow", extra=fields(
+                    time=inferred_start_dt.strftime('%H:%M'), date=current_date_str, now=now_ist.strftime('%H:%M')))
+
+            inferred_start_dt = inferred_start_dt.astimezone(ist_timezone) # Ensure IST timezone
+
+    return inferred_start_dt
+
+
+def _resolve_end(value, start_dt):
+    """Datetime for end_time: full ISO, or a bare clock time on the start's date."""
+    try:
+        end_dt = datetime.fromisoformat(value)
+        if end_dt.tzinfo is None:
+            end_dt = end_dt.replace(tzinfo=IST)
+        return end_dt
+    except ValueError:
+        pass
+    if start_dt is None:
+        return None
+    try:
+        time_part = datetime.strptime(value, "%H:%M").time()
+    except ValueError:
+        return None
+    end_dt = start_dt.replace(hour=time_part.hour, minute=time_part.minute, second=0)
+    if end_dt <= start_dt:
+        end_dt += timedelta(days=1)
+    return end_dt
+
+
+def _apply_parsed(state, parsed, now_ist):
+    """Fill the intent fields of AgentState from a model-shaped dict."""
+    extracted_summary = parsed.get("summary", "")
+    if not extracted_summary and parsed.get("intent") == "booking":
+        extracted_summary = "Meeting" # Default summary if model doesn't provide one
+
+    # Handle start_time parsing and date inference
+    start_time_from_model = parsed.get("start_time", "")
+    inferred_start_dt = _resolve_start(start_time_from_model, now_ist) if start_time_from_model else None
+
+    # Fallback to an empty string if no valid datetime could be inferred, or convert to ISO
+    final_start_time_iso = inferred_start_dt.isoformat() if inferred_start_dt else ""
+
+    end_dt = _resolve_end(parsed.get("end_time") or "", inferred_start_dt)
+    final_end_time_iso = end_dt.isoformat() if end_dt else ""
+
+    return {
+        **state,
+        "intent": parsed.get("intent", "unknown"),
+        "summary": extracted_summary,
+        "start_time": final_start_time_iso,
+        "end_time": final_end_time_iso,
+        "duration_minutes": parsed.get("duration_minutes") or 30,
+        "attendees": [a for a in parsed.get("attendees") or [] if isinstance(a, str)],
+        "replaces": _replaced_booking(state, parsed),
+        "output": "Processing your request..."
+    }
+
+
+def _apply_model_output(state, content, now_ist, cache_key=None):
+    """Turn the raw model response into the intent fields of AgentState.
+
+    Only answers that parse are memoized under cache_key.
+    """
+    log.debug("model_output", extra=fields(content=content))
 
+    try:
+        parsed = json.loads(content)
+    except json.JSONDecodeError as e:
+        INTENT_PARSE_FAILURES.inc(mode="json")
         return {
             **state,
-            "intent": parsed.get("intent", "unknown"),
-            "summary": extracted_summary,
-            "start_time": final_start_time_iso,
-            "duration_minutes": parsed.get("duration_minutes", 30),
-            "output": "Processing your request..."
+            "intent": "error",
+            "output": f"❌ JSON parse error: {e}\nRaw response: {content}"
         }
 
-    except Exception as e:
-        # Re-raise or log more specifically if needed
-        print(f"❌ Error in handle_input: {e}")
-        traceback.print_exc() # Print full traceback
+    if cache_key is not None and isinstance(parsed, dict):
+        llm_cache.put(cache_key, parsed)
+    return _apply_parsed(state, parsed, now_ist)
+
+
+def _apply_structured_output(state, result, now_ist, cache_key=None):
+    """Same as _apply_model_output for the {"raw", "parsed", "parsing_error"} dict of structured mode."""
+    fields = result.get("parsed")
+    if fields is None:
+        INTENT_PARSE_FAILURES.inc(mode="structured")
         return {
             **state,
             "intent": "error",
-            "output": str(e)
+            "output": f"❌ Structured output error: {result.get('parsing_error')}\nRaw response: {result.get('raw')}"
         }
+    parsed = fields.model_dump()
+    if cache_key is not None:
+        llm_cache.put(cache_key, parsed)
+    return _apply_parsed(state, parsed, now_ist)
+
+
+def _usable_response(response):
+    """Whether a model answer can be turned into intent fields (the router's validity check)."""
+    if isinstance(response, dict):
+        return response.get("parsed") is not None
+    try:
+        return isinstance(json.loads(response.content), dict)
+    except (json.JSONDecodeError, TypeError):
+        return False
+
+
+def _apply_response(state, response, now_ist, cache_key=None):
+    if isinstance(response, dict):
+        return _apply_structured_output(state, response, now_ist, cache_key)
+    return _apply_model_output(state, response.content, now_ist, cache_key)
+
+
+def _input_error(state, e):
+    log.exception("input_failed")
+    return {
+        **state,
+        "intent": "error",
+        "output": str(e)
+    }
+
+
+def handle_input(state):
+    try:
+        state.setdefault("intent", "unknown")
+        state.setdefault("output", "")
+
+        # Get current time for context
+        now_ist = datetime.now(IST)
+
+        previous = _previous_request(state)
+        state["replaces"] = {}
+        parsed = _fast_path(state["input"], previous, now_ist)
+        if parsed is not None:
+            return _apply_parsed(state, parsed, now_ist)
+
+        key = cache_key(_model_input(state["input"], previous), now_ist)
+        cached = llm_cache.get(key)
+        if cached is not None:
+            return _apply_parsed(state, cached, now_ist)
+
+        with observe_dependency("model", "invoke"):
+            response = model_router.invoke(
+                get_chain(), get_chain(fallback=True), _prompt_inputs(state, now_ist, previous), _usable_response)
+        return _apply_response(state, response, now_ist, cache_key=key)
+
+    except Exception as e:
+        return _input_error(state, e)
+
+
+async def ahandle_input(state):
+    """Async twin of handle_input; awaits the model instead of blocking."""
+    try:
+        state.setdefault("intent", "unknown")
+        state.setdefault("output", "")
+
+        now_ist = datetime.now(IST)
+
+        previous = _previous_request(state)
+        state["replaces"] = {}
+        parsed = _fast_path(state["input"], previous, now_ist)
+        if parsed is not None:
+            return _settle_prefetch(_apply_parsed(state, parsed, now_ist))
+
+        key = cache_key(_model_input(state["input"], previous), now_ist)
+        cached = llm_cache.get(key)
+        if cached is not None:
+            return _settle_prefetch(_apply_parsed(state, cached, now_ist))
+
+        with observe_dependency("model", "invoke"):
+            response = await model_router.ainvoke(
+                get_chain(), get_chain(fallback=True), _prompt_inputs(state, now_ist, previous), _usable_response)
+        return _settle_prefetch(_apply_response(state, response, now_ist, cache_key=key))
+
+    except Exception as e:
+        cancel_prefetch()
+        return _input_error(state, e)
+
+
+# Intents whose nodes read the user's own busy intervals (and so use the prefetch).
+PREFETCH_INTENTS = {"booking", "check_availability"}
+
+
+def _settle_prefetch(state):
+    if state.get("intent") not in PREFETCH_INTENTS:
+        cancel_prefetch()
+    return state
+
+
+def _booking_window(state):
+    """Return (summary, start_dt, end_dt) for a booking, or None if no time."""
+    start = state.get("start_time")
+    if not start:
+        return None
+
+    duration = state.get("duration_minutes", 30)
+    # Use the summary from state, or a fallback if still somehow empty
+    summary = state.get("summary") or "Meeting" # Ensures it's never empty
+
+    # Convert to datetime and calculate end time
+    # Ensure start_dt has timezone info before adding timedelta
+    start_dt = datetime.fromisoformat(start)
+    # If it doesn't have timezone (which it should if handle_input is good), assign IST
+    if start_dt.tzinfo is None:
+         start_dt = start_dt.replace(tzinfo=IST)
+
+    end_dt = start_dt + timedelta(minutes=duration)
+    return summary, start_dt, end_dt
+
+
+def _booking_error(state, e):
+    log.exception("booking_failed")
+    state["output"] = f"❌ Booking error: {str(e)}"
+    state["intent"] = "error"
+    return state
+
+
+def _booked(state, event, summary, start_dt, end_dt):
+    """Record the booked event so a follow-up turn can move it instead of double-booking."""
+    verb = "Moved" if state.get("replaces") else "Successfully booked"
+    state["booked"] = {"id": event["id"], "start": start_dt.isoformat(), "end": end_dt.isoformat(), "summary": summary}
+    state["output"] = f"✅ {verb}: {summary} at {start_dt.strftime('%I:%M %p')}"
+    return state
+
+
+def _forget_booking(state):
+    """A failed new booking leaves nothing for a follow-up to move; a failed move keeps its event."""
+    if not state.get("replaces"):
+        state["booked"] = {}
+    return state
+
+
+def _conflict_output(state, conflict):
+    message = f"⚠️ {conflict.start.strftime('%a %d %b %I:%M %p')} clashes with an existing event."
+    if conflict.alternatives:
+        options = "\n".join(f"• {a.astimezone(IST).strftime('%a %d %b %I:%M %p')}" for a in conflict.alternatives)
+        message += f" Free alternatives:\n{options}"
+    state["output"] = message
+    return state
+
+
 def handle_booking(state):
     try:
-        start = state.get("start_time")
-        if not start:
+        window = _booking_window(state)
+        if window is None:
             state["output"] = "I didn't get the time. Please try again with a valid time."
             return state
+        summary, start_dt, end_dt = window
+
+        event = conflict_guard.book(summary, start_dt, end_dt, token_var.get(), replaces=state.get("replaces"))
+        _booked(state, event, summary, start_dt, end_dt)
+    except BookingConflict as conflict:
+        return _conflict_output(_forget_booking(state), conflict)
+    except CalendarOverloaded:
+        raise  # surfaced as a 503 by the API, not as an agent answer
+    except Exception as e:
+        return _booking_error(_forget_booking(state), e)
+    return state
+
+
+async def ahandle_booking(state):
+    try:
+        window = _booking_window(state)
+        if window is None:
+            state["output"] = "I didn't get the time. Please try again with a valid time."
+            return state
+        summary, start_dt, end_dt = window
+
+        await seed_booking_index(token_var.get(), start_dt, end_dt)
+        event = await run_blocking(
+            conflict_guard.book, summary, start_dt, end_dt, token_var.get(), state.get("replaces"),
+            user=user_key(token_var.get()))
+        _booked(state, event, summary, start_dt, end_dt)
+    except BookingConflict as conflict:
+        return _conflict_output(_forget_booking(state), conflict)
+    except CalendarOverloaded:
+        raise
+    except Exception as e:
+        return _booking_error(_forget_booking(state), e)
+    return state
+
 
-        duration = state.get("duration_minutes", 30)
-        # Use the summary from state, or a fallback if still somehow empty
-        summary = state.get("summary") or "Meeting" # Ensures it's never empty
+def _availability_window(state):
+    """The [start, end) the user asked about.
 
-        # Convert to datetime and calculate end time
-        # Ensure start_dt has timezone info before adding timedelta
+    Falls back to the rest of the asked-about day when only a start is
+    known, and to the next 24 hours when nothing was extracted.
+    """
+    start = state.get("start_time")
+    end = state.get("end_time")
+    if start:
         start_dt = datetime.fromisoformat(start)
-        # If it doesn't have timezone (which it should if handle_input is good), assign IST
-        if start_dt.tzinfo is None:
-             ist_timezone = timezone(timedelta(hours=5, minutes=30))
-             start_dt = start_dt.replace(tzinfo=ist_timezone)
+        if end:
+            return start_dt, datetime.fromisoformat(end)
+        day_end = start_dt.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        return start_dt, day_end
+    # Minute resolution lets identical concurrent questions share one read.
+    now = datetime.now(IST).replace(second=0, microsecond=0)
+    return now, now + timedelta(days=1)
+
+
+def _describe_window(window_start, window_end):
+    """The window in words: "all day on Fri 17 Oct", "for the rest of ...", "from ... to ..."."""
+    start, end = window_start.astimezone(IST), window_end.astimezone(IST)
+    day = start.strftime('%a %d %b')
+    if end == start.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1):
+        return f"all day on {day}" if start.hour == start.minute == 0 else f"for the rest of {day}"
+    if end.date() == start.date():
+        return f"from {start.strftime('%I:%M %p')} to {end.strftime('%I:%M %p')} on {day}"
+    return f"from {start.strftime('%a %d %b %I:%M %p')} to {end.strftime('%a %d %b %I:%M %p')}"
+
+
+def _format_busy(state, busy, window_start, window_end):
+    if not busy:
+        state["output"] = f"You're free {_describe_window(window_start, window_end)}!"
+    else:
+        busy_list = "\n".join([
+            f"• {s.astimezone(IST).strftime('%a %d %b %I:%M %p')} – {e.astimezone(IST).strftime('%I:%M %p')}"
+            for s, e in busy
+        ])
+        state["output"] = f"You're busy at:\n{busy_list}"
+    return state
 
-        end_dt = start_dt + timedelta(minutes=duration)
 
-        book_event(summary, start_dt.isoformat(), end_dt.isoformat(), state["token"])
-        state["output"] = f"✅ Successfully booked: {summary} at {start_dt.strftime('%I:%M %p')}"
+def handle_availability(state):
+    try:
+        window_start, window_end = _availability_window(state)
+        busy = get_busy_intervals(token_var.get(), window_start, window_end)
+        _format_busy(state, busy.overlapping(window_start, window_end), window_start, window_end)
+    except CalendarOverloaded:
+        raise
     except Exception as e:
-        print(f"❌ Booking error in handle_booking: {e}") # Add this for better debugging
-        traceback.print_exc() # Print full traceback
-        state["output"] = f"❌ Booking error: {str(e)}"
+        state["output"] = f"❌ Calendar error: {str(e)}"
         state["intent"] = "error"
     return state
 
-def handle_availability(state):
+
+async def ahandle_availability(state):
     try:
-        events = check_availability(state["token"])
-        if not events:
-            state["output"] = "You're free all day!"
+        window_start, window_end = _availability_window(state)
+        busy = await prefetched_busy(token_var.get(), window_start, window_end)
+        if busy is None:
+            busy = await aget_busy_intervals(token_var.get(), window_start, window_end)
+        _format_busy(state, busy.overlapping(window_start, window_end), window_start, window_end)
+    except CalendarOverloaded:
+        raise
+    except Exception as e:
+        state["output"] = f"❌ Calendar error: {str(e)}"
+        state["intent"] = "error"
+    return state
+
+def _format_events(state, events, window_start, window_end):
+    window = _describe_window(window_start, window_end)
+    if not events:
+        state["output"] = f"Nothing on your calendar {window}!"
+        return state
+    lines = []
+    for e in events:
+        start, end = e["start"].get("dateTime"), e["end"].get("dateTime")
+        if start and end:
+            start, end = datetime.fromisoformat(start).astimezone(IST), datetime.fromisoformat(end).astimezone(IST)
+            when = f"{start.strftime('%a %d %b %I:%M %p')} – {end.strftime('%I:%M %p')}"
         else:
-            event_list = "\n".join([
-                f"• {e['summary']} ({e['start'].get('dateTime', 'all day')})"
-                for e in events
-            ])
-            state["output"] = f"Today's events:\n{event_list}"
+            when = f"{datetime.fromisoformat(e['start']['date']).strftime('%a %d %b')} (all day)"
+        lines.append(f"• {e.get('summary') or '(No title)'}: {when}")
+    state["output"] = f"Your calendar {window}:\n" + "\n".join(lines)
+    return state
+
+
+def handle_schedule(state):
+    """List the events in the asked-about window, with their titles."""
+    try:
+        window_start, window_end = _availability_window(state)
+        events = get_events(token_var.get(), window_start, window_end)
+        _format_events(state, events, window_start, window_end)
+    except CalendarOverloaded:
+        raise
+    except Exception as e:
+        state["output"] = f"❌ Calendar error: {str(e)}"
+        state["intent"] = "error"
+    return state
+
+
+async def ahandle_schedule(state):
+    try:
+        window_start, window_end = _availability_window(state)
+        events = await aget_events(token_var.get(), window_start, window_end)
+        _format_events(state, events, window_start, window_end)
+    except CalendarOverloaded:
+        raise
+    except Exception as e:
+        state["output"] = f"❌ Calendar error: {str(e)}"
+        state["intent"] = "error"
+    return state
+
+# How far ahead find_slot looks when no window was given.
+FIND_SLOT_DEFAULT_DAYS = int(os.getenv("FIND_SLOT_DEFAULT_DAYS", "7"))
+
+
+def _find_slot_window(state):
+    start = state.get("start_time")
+    end = state.get("end_time")
+    now = datetime.now(IST)
+    start_dt = max(datetime.fromisoformat(start), now) if start else now
+    end_dt = datetime.fromisoformat(end) if end else start_dt + timedelta(days=FIND_SLOT_DEFAULT_DAYS)
+    return start_dt, end_dt
+
+
+def _find_slot_request(state):
+    """(window_start, window_end, duration, calendar_ids), or an error message."""
+    attendees = state.get("attendees") or []
+    unknown = [a for a in attendees if "@" not in a]
+    if unknown:
+        return f"I need email addresses to check other calendars (got: {', '.join(unknown)})."
+    window_start, window_end = _find_slot_window(state)
+    duration = state.get("duration_minutes") or 30
+    calendar_ids = ["primary"] + [a for a in attendees if a != "primary"]
+    return window_start, window_end, duration, calendar_ids
+
+
+def _format_slots(state, busy, unavailable, window_start, window_end, duration):
+    slots = find_free_slots(busy, window_start, window_end, duration, working_hours=WORKING_HOURS)
+    if not slots:
+        state["output"] = f"No {duration}-minute slot works for everyone between {window_start.strftime('%a %d %b')} and {window_end.strftime('%a %d %b')}."
+    else:
+        slot_list = "\n".join([
+            f"• {s.astimezone(IST).strftime('%a %d %b %I:%M %p')} – {e.astimezone(IST).strftime('%I:%M %p')}"
+            for s, e in slots
+        ])
+        state["output"] = f"Everyone is free at:\n{slot_list}"
+    if unavailable:
+        state["output"] += f"\n(Couldn't see the calendars of: {', '.join(unavailable)})"
+    return state
+
+
+def handle_find_slot(state):
+    """Find times when the user and every attendee are free."""
+    try:
+        request = _find_slot_request(state)
+        if isinstance(request, str):
+            state["output"] = request
+            return state
+        window_start, window_end, duration, calendar_ids = request
+        busy, unavailable = {}, []
+        for i in range(0, len(calendar_ids), FREEBUSY_MAX_CALENDARS):
+            chunk_busy, chunk_unavailable = get_busy_by_calendar(
+                token_var.get(), window_start, window_end, calendar_ids[i:i + FREEBUSY_MAX_CALENDARS])
+            busy.update(chunk_busy)
+            unavailable.extend(chunk_unavailable)
+        _format_slots(state, busy, unavailable, window_start, window_end, duration)
+    except CalendarOverloaded:
+        raise
     except Exception as e:
         state["output"] = f"❌ Calendar error: {str(e)}"
         state["intent"] = "error"
     return state
 
+
+async def ahandle_find_slot(state):
+    try:
+        request = _find_slot_request(state)
+        if isinstance(request, str):
+            state["output"] = request
+            return state
+        window_start, window_end, duration, calendar_ids = request
+        # Attendee chunks are fetched concurrently.
+        busy, unavailable = await aget_busy_by_calendar(token_var.get(), window_start, window_end, calendar_ids)
+        _format_slots(state, busy, unavailable, window_start, window_end, duration)
+    except CalendarOverloaded:
+        raise
+    except Exception as e:
+        state["output"] = f"❌ Calendar error: {str(e)}"
+        state["intent"] = "error"
+    return state
+
+
+BATCH_PARSE_CONCURRENCY = int(os.getenv("BATCH_PARSE_CONCURRENCY", "16"))
+
+
+async def abook_batch(messages, token):
+    """Parse many booking messages concurrently and insert them in batches.
+
+    Returns one result dict per message, in order.
+    """
+    sem = asyncio.Semaphore(BATCH_PARSE_CONCURRENCY)
+
+    async def parse(message):
+        async with sem:
+            return await ahandle_input({
+                "input": message, "intent": "", "summary": "",
+                "start_time": "", "end_time": "", "duration_minutes": 0, "output": "",
+                "trace_id": trace_id_var.get()
+            })
+
+    states = await asyncio.gather(*(parse(m) for m in messages))
+
+    results = []
+    to_book = []
+    for i, (message, state) in enumerate(zip(messages, states)):
+        result = {"index": i, "message": message}
+        if state.get("intent") != "booking":
+            result.update(status="error", error=state.get("output") or "Not a booking request.")
+        else:
+            try:
+                window = _booking_window(state)
+            except ValueError:
+                window = None
+            if window is None:
+                result.update(status="error", error="I didn't get the time. Please try again with a valid time.")
+            else:
+                summary, start_dt, end_dt = window
+                result.update(summary=summary, start_time=start_dt.isoformat())
+                to_book.append((i, (summary, start_dt, end_dt)))
+        results.append(result)
+
+    if to_book:
+        booked = await run_blocking(conflict_guard.book_many, [event for _, event in to_book], token,
+                                    user=user_key(token))
+        for (i, _), outcome in zip(to_book, booked):
+            if "error" in outcome:
+                results[i].update(status="error", error=outcome["error"])
+                if outcome.get("alternatives"):
+                    results[i]["alternatives"] = outcome["alternatives"]
+            else:
+                results[i].update(status="booked", link=outcome["link"])
+    return results
+
+
 def handle_error(state):
     return {
         **state,
         "output": f"❌ Error: {state.get('output', 'Unknown error occurred')}"
     }
 
-def langgraph_agent():
+def langgraph_agent(checkpointer=None):
+    """Compile the graph; with a checkpointer, state persists per thread_id between turns."""
+    from langgraph.graph import StateGraph
+    from langchain_core.runnables import RunnableLambda
+
     builder = StateGraph(AgentState)
 
     # Add all nodes
-    builder.add_node("input", RunnableLambda(handle_input))
-    builder.add_node("book", RunnableLambda(handle_booking))
-    builder.add_node("check", RunnableLambda(handle_availability))
-    builder.add_node("error_handler", RunnableLambda(handle_error))
+    # Each node has a sync and an async body: graph.invoke runs the former,
+    # graph.ainvoke the latter without blocking the event loop.
+    builder.add_node("input", RunnableLambda(timed_node("input", handle_input), afunc=atimed_node("input", ahandle_input)))
+    builder.add_node("book", RunnableLambda(timed_node("book", handle_booking), afunc=atimed_node("book", ahandle_booking)))
+    builder.add_node("check", RunnableLambda(timed_node("check", handle_availability), afunc=atimed_node("check", ahandle_availability)))
+    builder.add_node("schedule", RunnableLambda(timed_node("schedule", handle_schedule), afunc=atimed_node("schedule", ahandle_schedule)))
+    builder.add_node("find_slot", RunnableLambda(timed_node("find_slot", handle_find_slot), afunc=atimed_node("find_slot", ahandle_find_slot)))
+    builder.add_node("error_handler", RunnableLambda(timed_node("error_handler", handle_error)))
     builder.add_node("end", lambda x: x)
 
     # Set up conditional routing
@@ -227,7 +833,8 @@ def langgraph_agent():
         {
             "booking": "book",
             "check_availability": "check",
-            "query_schedule": "check", 
+            "query_schedule": "schedule",
+            "find_slot": "find_slot",
             "error": "error_handler",
             "unknown": "end"
         }
@@ -236,10 +843,12 @@ def langgraph_agent():
     # Simple linear flows
     builder.add_edge("book", "end")
     builder.add_edge("check", "end")
+    builder.add_edge("schedule", "end")
+    builder.add_edge("find_slot", "end")
     builder.add_edge("error_handler", "end")
 
     # Set entry and finish points
     builder.set_entry_point("input")
     builder.set_finish_point("end")
 
-    return builder.compile()
\ No newline at end of file
+    return builder.compile(checkpointer=checkpointer)
\ No newline at end of file
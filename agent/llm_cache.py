@@ -0,0 +1,95 @@
+# agent/llm_cache.py
+#
+# Memoizes parsed intent JSON from the model. Keys combine the normalized
+# user input with the current date and a coarse time bucket, so answers
+# that depend on "now" (e.g. "at 3pm" rolling to tomorrow) are not reused
+# across the point where they would change.
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+from cachetools import TTLCache
+
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "2048"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "900"))
+LLM_CACHE_BUCKET_MINUTES = int(os.getenv("LLM_CACHE_BUCKET_MINUTES", "15"))
+# Optional SQLite file so cached answers survive restarts; empty = memory only.
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "")
+
+
+def normalize(user_input: str) -> str:
+    text = re.sub(r"\s+", " ", user_input.lower()).strip()
+    return text.rstrip("?!. ")
+
+
+def cache_key(user_input: str, now_ist) -> str:
+    bucket = (now_ist.hour * 60 + now_ist.minute) // LLM_CACHE_BUCKET_MINUTES
+    raw = f"{normalize(user_input)}|{now_ist.strftime('%Y-%m-%d')}|{bucket}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _DiskBackend:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT value FROM llm_cache WHERE key=? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, value, ttl):
+        conn = self._conn()
+        now = time.time()
+        conn.execute("INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?)", (key, json.dumps(value), now + ttl))
+        conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+
+
+class LLMCache:
+    """LRU+TTL cache of parsed model output, optionally backed by disk."""
+
+    def __init__(self, maxsize=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL, path=LLM_CACHE_PATH):
+        self.ttl = ttl
+        self._memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._disk = _DiskBackend(path) if path else None
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key):
+        with self._lock:
+            value = self._memory.get(key)
+        if value is None and self._disk is not None:
+            value = self._disk.get(key)
+            if value is not None:
+                with self._lock:
+                    self._memory[key] = value
+        with self._lock:
+            self.stats["hits" if value is not None else "misses"] += 1
+        return value
+
+    def put(self, key, parsed):
+        """Store a successfully parsed model answer (never an error)."""
+        with self._lock:
+            self._memory[key] = parsed
+        if self._disk is not None:
+            self._disk.put(key, parsed, self.ttl)
+
+
+llm_cache = LLMCache()
@@ -0,0 +1,141 @@
+# agent/logs.py
+#
+# Structured logging. Records are stamped with the trace ID and sampled on
+# the calling thread, then handed to a QueueHandler; JSON formatting,
+# redaction and the stdout write happen on a QueueListener thread, so a log
+# call on the request path costs a queue put rather than blocking I/O.
+#
+#   log = logging.getLogger(__name__)
+#   log.debug("graph_invoke", extra=fields(state=initial_state))
+
+import os
+import re
+import sys
+import json
+import atexit
+import hashlib
+import logging
+import logging.handlers
+import queue
+import random
+from datetime import datetime, timezone
+
+from agent.metrics import trace_id_var
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Fraction of requests whose DEBUG events are kept (decided per trace ID, so a
+# sampled request keeps all of its debug lines).
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.01"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", "2000"))
+
+REDACTED = "[redacted]"
+SECRET_KEYS = {"token", "access_token", "refresh_token", "id_token", "client_secret", "authorization", "code"}
+# Secrets that can hide inside free text: OAuth token JSON and bare Google tokens.
+SECRET_PATTERNS = [
+    (re.compile(r'("(?:token|access_token|refresh_token|id_token|client_secret)"\s*:\s*)"[^"]*"'), r'\1"' + REDACTED + '"'),
+    (re.compile(r"\bya29\.[\w.-]+"), REDACTED),
+    (re.compile(r"\b1//[\w-]{20,}"), REDACTED),
+]
+
+
+def fields(**values):
+    """extra= payload for structured fields: log.info("event", extra=fields(k=v)).
+
+    Dicts are copied one level deep: the record is serialized later, on the
+    listener thread, and graph state keeps changing after it is logged.
+    """
+    return {"fields": {k: dict(v) if isinstance(v, dict) else v for k, v in values.items()}}
+
+
+def redact(value):
+    """Copy of value with secret-looking keys and substrings masked."""
+    if isinstance(value, dict):
+        return {k: REDACTED if str(k).lower() in SECRET_KEYS and v else redact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    if isinstance(value, str):
+        for pattern, replacement in SECRET_PATTERNS:
+            value = pattern.sub(replacement, value)
+        if len(value) > LOG_MAX_FIELD_CHARS:
+            value = value[:LOG_MAX_FIELD_CHARS] + f"…(+{len(value) - LOG_MAX_FIELD_CHARS} chars)"
+        return value
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return redact(str(value))
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        if getattr(record, "trace_id", None):
+            entry["trace_id"] = record.trace_id
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(redact(entry), ensure_ascii=False, default=str)
+
+
+class ContextFilter(logging.Filter):
+    """Runs on the caller's thread: stamps the trace ID and samples DEBUG records."""
+
+    def __init__(self, sample_rate=LOG_DEBUG_SAMPLE_RATE):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        trace_id = trace_id_var.get()
+        record.trace_id = trace_id
+        if record.levelno > logging.DEBUG or self.sample_rate >= 1:
+            return True
+        if trace_id:
+            bucket = int.from_bytes(hashlib.blake2b(trace_id.encode(), digest_size=4).digest(), "big")
+            return bucket < self.sample_rate * 2 ** 32
+        return random.random() < self.sample_rate
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Leaves formatting to the listener; drops records rather than block when full."""
+
+    def prepare(self, record):
+        # Keep the record as-is (fields stay structured); only pin down the
+        # traceback text, which can't cross threads lazily.
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+_listener = None
+
+
+def configure_logging(level=LOG_LEVEL, stream=None):
+    """Route the root logger through a background JSON writer (idempotent)."""
+    global _listener
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter())
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    handler = _QueueHandler(log_queue)
+    handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=False)
+    _listener.start()
+    atexit.register(_listener.stop)
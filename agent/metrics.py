@@ -0,0 +1,177 @@
+# agent/metrics.py
+#
+# Minimal in-process metrics with Prometheus text exposition, plus the
+# per-request trace ID that ties slow requests to slow dependencies.
+
+import os
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Dependency calls slower than this are logged with their trace ID.
+SLOW_CALL_SECONDS = float(os.getenv("SLOW_CALL_SECONDS", "2"))
+
+trace_id_var = contextvars.ContextVar("trace_id", default="")
+log = logging.getLogger(__name__)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{n}="' + str(v).replace("\\", "\\\\").replace('"', '\\"') + '"' for n, v in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class CollectedCounter(Counter):
+    """A counter whose values are copied by a collector from running totals kept elsewhere."""
+
+    def set(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Gauge(CollectedCounter):
+    def render(self):
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * len(self.buckets), 0, 0.0])
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[0][i] += 1
+            series[1] += 1
+            series[2] += seconds
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, count, total) in sorted(self._series.items()):
+                for bound, c in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels + ('le',), key + (bound,))} {c}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels + ('le',), key + ('+Inf',))} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect):
+        """Call collect() before every render, e.g. to refresh gauges."""
+        self._collectors.append(collect)
+
+    def render(self):
+        for collect in self._collectors:
+            collect()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.register(Histogram(
+    "chat_request_seconds", "End-to-end /chat latency.", ("endpoint", "intent", "outcome")))
+NODE_SECONDS = registry.register(Histogram(
+    "graph_node_seconds", "Time spent in each LangGraph node.", ("node", "intent", "outcome")))
+FIRST_EVENT_SECONDS = registry.register(Histogram(
+    "chat_stream_first_event_seconds",
+    "Time from a /chat/stream request to its first model token or parsed intent.", ("event",)))
+DEPENDENCY_SECONDS = registry.register(Histogram(
+    "dependency_call_seconds", "Latency of external calls (model, discovery build, Calendar API).",
+    ("dependency", "operation", "outcome")))
+DEPENDENCY_ERRORS = registry.register(Counter(
+    "dependency_errors_total", "External calls that raised.", ("dependency", "operation")))
+
+
+@contextmanager
+def observe_dependency(dependency, operation=""):
+    """Time an external call; slow ones are logged with the current trace ID."""
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except Exception:
+        outcome = "error"
+        DEPENDENCY_ERRORS.inc(dependency=dependency, operation=operation)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        DEPENDENCY_SECONDS.observe(elapsed, dependency=dependency, operation=operation, outcome=outcome)
+        if elapsed >= SLOW_CALL_SECONDS:
+            log.warning("slow_dependency_call", extra={"fields": {
+                "dependency": dependency, "operation": operation, "seconds": round(elapsed, 3)}})
+
+
+def _node_outcome(result):
+    intent = result.get("intent", "unknown") if isinstance(result, dict) else "unknown"
+    return intent, "error" if intent == "error" else "ok"
+
+
+def timed_node(name, func):
+    def wrapper(state):
+        if state.get("trace_id"):
+            trace_id_var.set(state["trace_id"])
+        start = time.perf_counter()
+        result = func(state)
+        intent, outcome = _node_outcome(result)
+        NODE_SECONDS.observe(time.perf_counter() - start, node=name, intent=intent, outcome=outcome)
+        return result
+    return wrapper
+
+
+def atimed_node(name, func):
+    async def wrapper(state):
+        if state.get("trace_id"):
+            trace_id_var.set(state["trace_id"])
+        start = time.perf_counter()
+        result = await func(state)
+        intent, outcome = _node_outcome(result)
+        NODE_SECONDS.observe(time.perf_counter() - start, node=name, intent=intent, outcome=outcome)
+        return result
+    return wrapper
@@ -0,0 +1,242 @@
+# agent/model_router.py
+#
+# Deadline-aware, hedged model calls. Every call gets a deadline; if the
+# primary hasn't produced a valid answer by the recent p<HEDGE_PERCENTILE>
+# latency, a second request goes to the fallback model (or the primary
+# again) and the first valid answer wins. A circuit breaker sends traffic
+# straight to the fallback while the primary is failing or slow.
+
+import os
+import time
+import asyncio
+import threading
+import contextvars
+import concurrent.futures
+from collections import deque
+
+MODEL_DEADLINE = float(os.getenv("MODEL_DEADLINE", "20"))
+HEDGE_ENABLED = os.getenv("MODEL_HEDGE", "1") == "1"
+HEDGE_PERCENTILE = float(os.getenv("MODEL_HEDGE_PERCENTILE", "95"))
+# Used until enough latencies have been seen to estimate the percentile.
+HEDGE_DEFAULT_AFTER = float(os.getenv("MODEL_HEDGE_DEFAULT_AFTER", "3"))
+HEDGE_MIN_AFTER = float(os.getenv("MODEL_HEDGE_MIN_AFTER", "0.25"))
+LATENCY_WINDOW = 256
+LATENCY_MIN_SAMPLES = 20
+BREAKER_FAILURES = int(os.getenv("MODEL_BREAKER_FAILURES", "5"))
+BREAKER_SLOW_SECONDS = float(os.getenv("MODEL_BREAKER_SLOW_SECONDS", "10"))
+BREAKER_COOLDOWN = float(os.getenv("MODEL_BREAKER_COOLDOWN", "30"))
+
+
+class CircuitBreaker:
+    """Opens after `failures` consecutive errors/slow calls; after `cooldown`
+    seconds one probe is let through (half-open) and its outcome decides."""
+
+    def __init__(self, failures=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._consecutive = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self._opened_at >= self.cooldown else "open"
+
+    def allow(self):
+        """True if the primary may be called now."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def release(self):
+        """The probe was abandoned without an outcome; let the next call probe."""
+        with self._lock:
+            self._probing = False
+
+    def record(self, ok):
+        with self._lock:
+            self._probing = False
+            if ok:
+                self._consecutive = 0
+                self._opened_at = None
+                return
+            self._consecutive += 1
+            if self._opened_at is not None or self._consecutive >= self.failures:
+                self._opened_at = time.monotonic()
+
+
+class LatencyWindow:
+    """Recent successful primary latencies, for the hedge threshold."""
+
+    def __init__(self, size=LATENCY_WINDOW):
+        self._values = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._values.append(seconds)
+
+    def percentile(self, pct, default):
+        with self._lock:
+            if len(self._values) < LATENCY_MIN_SAMPLES:
+                return default
+            ordered = sorted(self._values)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class ModelRouter:
+    def __init__(self, deadline=MODEL_DEADLINE, hedge=HEDGE_ENABLED, hedge_percentile=HEDGE_PERCENTILE):
+        self.deadline = deadline
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.breaker = CircuitBreaker()
+        self.latencies = LatencyWindow()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=16, thread_name_prefix="model-hedge")
+        self.stats = {"calls": 0, "hedged": 0, "hedge_wins": 0, "fallback_routed": 0, "deadline_exceeded": 0}
+
+    def hedge_after(self):
+        return max(HEDGE_MIN_AFTER, self.latencies.percentile(self.hedge_percentile, HEDGE_DEFAULT_AFTER))
+
+    def _plan(self, primary, fallback):
+        """(first chain, its role, hedge chain) for one call."""
+        self.stats["calls"] += 1
+        if self.breaker.allow() or fallback is None:
+            return primary, "primary", fallback or primary
+        self.stats["fallback_routed"] += 1
+        return fallback, "fallback", fallback
+
+    def _settle(self, role, ok, elapsed):
+        if role != "primary":
+            return
+        if ok:
+            self.latencies.add(elapsed)
+        self.breaker.record(ok and elapsed < BREAKER_SLOW_SECONDS)
+
+    def _won(self, role):
+        if role == "hedge":
+            self.stats["hedge_wins"] += 1
+
+    def _timed_out(self, attempts, started, deadline):
+        self.stats["deadline_exceeded"] += 1
+        if "primary" in attempts.values():
+            self._settle("primary", False, time.monotonic() - started)
+        return f"model call exceeded its {deadline or self.deadline:.1f}s deadline"
+
+    def _abandon(self, attempts):
+        if "primary" in attempts.values():
+            self.breaker.release()
+
+    async def ainvoke(self, primary, fallback, inputs, valid, deadline=None):
+        """First valid answer from primary (or a hedge) within the deadline.
+
+        `valid(response)` decides whether an answer can be used. If every
+        attempt finishes without one, the last answer (or error) is returned
+        (or raised) so the caller can report it. asyncio.TimeoutError past
+        the deadline.
+        """
+        first, role, hedge_chain = self._plan(primary, fallback)
+        started = time.monotonic()
+        expires = started + (deadline or self.deadline)
+        attempts = {asyncio.ensure_future(first.ainvoke(inputs)): role}
+        hedge_at = started + self.hedge_after() if self.hedge else None
+        last_error, last_response = None, None
+        try:
+            while attempts:
+                now = time.monotonic()
+                if now >= expires:
+                    break
+                wake = min(expires, hedge_at) if hedge_at else expires
+                done, _ = await asyncio.wait(attempts, timeout=max(0, wake - now),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    done_role = attempts.pop(task)
+                    error = task.exception()
+                    ok = error is None and valid(task.result())
+                    self._settle(done_role, ok, time.monotonic() - started)
+                    if ok:
+                        self._won(done_role)
+                        return task.result()
+                    if error is not None:
+                        last_error = error
+                    else:
+                        last_response = task.result()
+                if hedge_at and (time.monotonic() >= hedge_at or not attempts):
+                    # Slow, failed or invalid first answer: send the hedge now.
+                    hedge_at = None
+                    self.stats["hedged"] += 1
+                    attempts[asyncio.ensure_future(hedge_chain.ainvoke(inputs))] = "hedge"
+            if attempts:
+                raise asyncio.TimeoutError(self._timed_out(attempts, started, deadline))
+        finally:
+            for task in attempts:
+                task.cancel()
+            self._abandon(attempts)
+        if last_response is not None:
+            return last_response
+        raise last_error
+
+    def invoke(self, primary, fallback, inputs, valid, deadline=None):
+        """Blocking twin of ainvoke; attempts run on a small thread pool.
+
+        Losing attempts can't be interrupted, only abandoned.
+        """
+        first, role, hedge_chain = self._plan(primary, fallback)
+        started = time.monotonic()
+        expires = started + (deadline or self.deadline)
+        attempts = {self._executor.submit(contextvars.copy_context().run, first.invoke, inputs): role}
+        hedge_at = started + self.hedge_after() if self.hedge else None
+        last_error, last_response = None, None
+        while attempts:
+            now = time.monotonic()
+            if now >= expires:
+                break
+            wake = min(expires, hedge_at) if hedge_at else expires
+            done, _ = concurrent.futures.wait(attempts, timeout=max(0, wake - now),
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                done_role = attempts.pop(future)
+                error = future.exception()
+                ok = error is None and valid(future.result())
+                self._settle(done_role, ok, time.monotonic() - started)
+                if ok:
+                    self._won(done_role)
+                    for other in attempts:
+                        other.cancel()
+                    self._abandon(attempts)
+                    return future.result()
+                if error is not None:
+                    last_error = error
+                else:
+                    last_response = future.result()
+            if hedge_at and (time.monotonic() >= hedge_at or not attempts):
+                hedge_at = None
+                self.stats["hedged"] += 1
+                attempts[self._executor.submit(contextvars.copy_context().run, hedge_chain.invoke, inputs)] = "hedge"
+        if attempts:
+            for future in attempts:
+                future.cancel()
+            raise TimeoutError(self._timed_out(attempts, started, deadline))
+        if last_response is not None:
+            return last_response
+        raise last_error
+
+    def snapshot(self):
+        hedged = self.stats["hedged"]
+        return {
+            **self.stats,
+            "hedge_rate": hedged / self.stats["calls"] if self.stats["calls"] else 0.0,
+            "hedge_win_rate": self.stats["hedge_wins"] / hedged if hedged else 0.0,
+            "hedge_after_seconds": self.hedge_after(),
+            "breaker": self.breaker.state,
+        }
+
+
+model_router = ModelRouter()
@@ -1,14 +1,17 @@
 # agent/oauth_utils.py
 
 import os
-from google_auth_oauthlib.flow import Flow
 from dotenv import load_dotenv
 
 load_dotenv()
 
-SCOPES = ["https://www.googleapis.com/auth/calendar.events"]
+SCOPES = [
+    "https://www.googleapis.com/auth/calendar.events",
+    "https://www.googleapis.com/auth/calendar.freebusy",
+]
 
 def get_google_flow():
+    from google_auth_oauthlib.flow import Flow  # heavy; only needed for OAuth round trips
     return Flow.from_client_config(
         {
             "web": {
@@ -0,0 +1,96 @@
+# agent/prefetch.py
+#
+# Speculative calendar read. /chat starts fetching the user's near-term busy
+# intervals the moment a request arrives, concurrently with the model call
+# that works out what the user wants. The booking and availability nodes
+# then await that in-flight read instead of starting their own, so a turn
+# costs roughly max(LLM, Calendar) instead of LLM + Calendar.
+#
+# The prefetch travels in a ContextVar: LangGraph runs each node in a copy
+# of the caller's context, and the copies all share the same _Prefetch.
+
+import os
+import asyncio
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+
+from agent.calendar import aget_busy_intervals
+from agent.conflicts import conflict_guard, INDEX_HORIZON_DAYS
+
+PREFETCH_ENABLED = os.getenv("SPECULATIVE_PREFETCH", "1") == "1"
+# Matches the booking index horizon so a prefetch can seed it directly.
+PREFETCH_HORIZON_DAYS = int(os.getenv("PREFETCH_HORIZON_DAYS", str(INDEX_HORIZON_DAYS)))
+
+_current = ContextVar("calendar_prefetch", default=None)
+stats = {"started": 0, "used": 0, "cancelled": 0, "missed": 0}
+
+
+class _Prefetch:
+    def __init__(self, token, start, end, task):
+        self.token = token
+        self.start = start
+        self.end = end
+        self.task = task
+
+    def covers(self, token, start, end):
+        return token == self.token and self.start <= start and end <= self.end
+
+
+def start_prefetch(token, tz):
+    """Begin reading busy intervals for the next PREFETCH_HORIZON_DAYS.
+
+    Must be called on the event loop, before the graph runs.
+    """
+    if not PREFETCH_ENABLED or not token:
+        return None
+    # Minute resolution lets identical concurrent prefetches share one read.
+    start = datetime.now(tz).replace(second=0, microsecond=0)
+    end = start + timedelta(days=PREFETCH_HORIZON_DAYS)
+    prefetch = _Prefetch(token, start, end, asyncio.ensure_future(aget_busy_intervals(token, start, end)))
+    # Retrieve failures so an unused, failed prefetch doesn't log "exception never retrieved".
+    prefetch.task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    _current.set(prefetch)
+    stats["started"] += 1
+    return prefetch
+
+
+def cancel_prefetch():
+    """Drop the current prefetch (intent needs no calendar, or the request is over).
+
+    The worker thread finishes its call regardless; only the wait is cancelled.
+    """
+    prefetch = _current.get()
+    if prefetch is not None and not prefetch.task.done():
+        prefetch.task.cancel()
+        stats["cancelled"] += 1
+
+
+async def prefetched_busy(token, start, end):
+    """The prefetched BusyIntervals if they cover [start, end), else None.
+
+    A failed or cancelled prefetch also returns None; callers then fetch
+    as they would have without one.
+    """
+    prefetch = _current.get()
+    if prefetch is None or not prefetch.covers(token, start, end) or prefetch.task.cancelled():
+        stats["missed"] += prefetch is not None
+        return None
+    try:
+        busy = await asyncio.shield(prefetch.task)
+    except (asyncio.CancelledError, Exception):
+        if not prefetch.task.done():
+            raise  # the caller itself was cancelled
+        stats["missed"] += 1
+        return None
+    stats["used"] += 1
+    return busy
+
+
+async def seed_booking_index(token, start, end):
+    """Hand a covering prefetch to the conflict guard so booking skips its own seed read."""
+    prefetch = _current.get()
+    if prefetch is None or not prefetch.covers(token, start, end):
+        return
+    busy = await prefetched_busy(token, prefetch.start, prefetch.end)
+    if busy is not None:
+        conflict_guard.seed(token, busy, prefetch.start, prefetch.end)
@@ -0,0 +1,252 @@
+# agent/rate_limit.py
+#
+# Admission control for Google Calendar calls. Every request from
+# agent/calendar.py passes through one scheduler that enforces a token
+# bucket per user and one for the whole process, so bursts are smoothed to
+# just under the quota instead of bouncing off it. A call that would wait
+# longer than CALENDAR_MAX_QUEUE_WAIT, or arrives with CALENDAR_MAX_QUEUE
+# callers already waiting (for a token, or for a worker thread in the async
+# path), is rejected straight away with CalendarOverloaded (a 503 at the
+# API) rather than tying up a worker; so is a user with
+# CALENDAR_MAX_PENDING_PER_USER calls already handed to the worker pool.
+# Rate-limit responses that still get through are retried with full-jitter
+# exponential backoff.
+
+import os
+import time
+import random
+import threading
+
+from cachetools import TTLCache
+
+from agent.metrics import registry, Counter, Gauge, Histogram
+
+CALENDAR_USER_QPS = float(os.getenv("CALENDAR_USER_QPS", "5"))
+CALENDAR_USER_BURST = float(os.getenv("CALENDAR_USER_BURST", "10"))
+# The global budget is for the whole deployment. Each uvicorn worker
+# (start.sh runs WEB_CONCURRENCY of them) has its own scheduler, so it gets
+# an even share. Per-user buckets are not split: a user's requests can land
+# on any worker, and what exceeds Google's per-user quota is retried.
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+CALENDAR_GLOBAL_QPS = float(os.getenv("CALENDAR_GLOBAL_QPS", "100")) / WEB_CONCURRENCY
+CALENDAR_GLOBAL_BURST = float(os.getenv("CALENDAR_GLOBAL_BURST", "200")) / WEB_CONCURRENCY
+CALENDAR_MAX_QUEUE = int(os.getenv("CALENDAR_MAX_QUEUE", "256"))
+CALENDAR_MAX_QUEUE_WAIT = float(os.getenv("CALENDAR_MAX_QUEUE_WAIT", "2"))
+# Calls one user may have queued or running on the worker pool at once, so a
+# throttled user's sleeps can't occupy every worker.
+CALENDAR_MAX_PENDING_PER_USER = int(os.getenv("CALENDAR_MAX_PENDING_PER_USER", "8"))
+CALENDAR_MAX_RETRIES = int(os.getenv("CALENDAR_MAX_RETRIES", "4"))
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 16.0
+# Reasons Google gives on a 403 when it means "slow down" rather than "forbidden".
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded", "quotaExceeded"}
+
+QUEUE_DEPTH = registry.register(Gauge(
+    "calendar_queue_depth", "Calendar calls waiting for a worker thread or a rate-limit token."))
+QUEUE_WAIT_SECONDS = registry.register(Histogram(
+    "calendar_queue_wait_seconds", "Time Calendar calls spent waiting for admission."))
+REJECTED = registry.register(Counter(
+    "calendar_rejected_total", "Calendar calls refused by admission control.", ("reason",)))
+RETRIES = registry.register(Counter(
+    "calendar_rate_limit_retries_total", "Calendar calls retried after a rate-limit response.", ("status",)))
+
+
+class CalendarOverloaded(Exception):
+    """Calendar capacity is exhausted for now; retry after `retry_after` seconds."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, cost=1, max_wait=None):
+        """Take `cost` tokens, going into debt if needed; returns how long to wait.
+
+        Returns None without taking anything if the wait would exceed max_wait.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = max(0.0, (cost - self._tokens) / self.rate)
+            if max_wait is not None and wait > max_wait:
+                return None
+            self._tokens -= cost
+            return wait
+
+    def refund(self, cost=1):
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + cost)
+
+
+def is_rate_limited(error):
+    """True for 429s and for 403s whose reason is a rate or quota limit."""
+    status = getattr(getattr(error, "resp", None), "status", None)
+    if status == 429:
+        return True
+    if status != 403:
+        return False
+    details = getattr(error, "error_details", None) or []
+    reasons = {d.get("reason") for d in details if isinstance(d, dict)}
+    return bool(reasons & RATE_LIMIT_REASONS) or getattr(error, "reason", "") in RATE_LIMIT_REASONS
+
+
+def backoff(attempt):
+    """Sleep a full-jitter exponential delay before retry number attempt + 1."""
+    time.sleep(random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)))
+
+
+class _Pending:
+    """A call handed to the worker pool; see CalendarScheduler.enqueue."""
+
+    def __init__(self, scheduler, user):
+        self._scheduler = scheduler
+        self.user = user
+        self.queued = True
+
+    def start(self):
+        """A worker has picked the call up."""
+        self._scheduler._dequeue(self)
+
+    def finish(self, *_):
+        """The call is over, whether or not it ever started."""
+        self._scheduler._release(self)
+
+
+class CalendarScheduler:
+    def __init__(self):
+        self.global_bucket = TokenBucket(CALENDAR_GLOBAL_QPS, CALENDAR_GLOBAL_BURST)
+        self._users = TTLCache(maxsize=100000, ttl=3600)
+        self._users_lock = threading.Lock()
+        # Guarded by _waiting_lock: calls sleeping for a token, calls waiting
+        # for a worker thread, and per-user calls queued or running.
+        self._waiting = 0
+        self._queued = 0
+        self._pending = {}
+        self._waiting_lock = threading.Lock()
+
+    def _user_bucket(self, user):
+        with self._users_lock:
+            bucket = self._users.get(user)
+            if bucket is None:
+                bucket = self._users[user] = TokenBucket(CALENDAR_USER_QPS, CALENDAR_USER_BURST)
+            return bucket
+
+    def enqueue(self, user):
+        """Account for a call about to be queued on the worker pool, or raise CalendarOverloaded.
+
+        Returns a handle whose start() the worker calls when it picks the
+        call up and whose finish() runs when the call is over.
+        """
+        with self._waiting_lock:
+            if self._pending.get(user, 0) >= CALENDAR_MAX_PENDING_PER_USER:
+                REJECTED.inc(reason="user_pending")
+                raise CalendarOverloaded("Too many calendar requests in flight for this user.",
+                                         1 / CALENDAR_USER_QPS)
+            if self._waiting + self._queued >= CALENDAR_MAX_QUEUE:
+                REJECTED.inc(reason="queue_full")
+                raise CalendarOverloaded("Calendar request queue is full.", CALENDAR_MAX_QUEUE_WAIT)
+            self._queued += 1
+            self._pending[user] = self._pending.get(user, 0) + 1
+            QUEUE_DEPTH.set(self._waiting + self._queued)
+        return _Pending(self, user)
+
+    def _dequeue(self, pending):
+        with self._waiting_lock:
+            if pending.queued:
+                pending.queued = False
+                self._queued -= 1
+                QUEUE_DEPTH.set(self._waiting + self._queued)
+
+    def _release(self, pending):
+        self._dequeue(pending)
+        with self._waiting_lock:
+            left = self._pending.pop(pending.user) - 1
+            if left:
+                self._pending[pending.user] = left
+
+    def admit(self, user, cost=1):
+        """Block until `cost` requests may be sent for `user`, or raise CalendarOverloaded.
+
+        A cost larger than a bucket's burst could never be reserved in one
+        go, so it is taken as a run of burst-sized pieces; if any piece is
+        refused, the pieces already taken are refunded.
+        """
+        piece = min(self._user_bucket(user).burst, self.global_bucket.burst)
+        taken = 0
+        try:
+            while cost - taken > piece:
+                self._admit(user, piece)
+                taken += piece
+            self._admit(user, cost - taken)
+        except CalendarOverloaded:
+            if taken:
+                self.refund(user, taken)
+            raise
+
+    def _admit(self, user, cost):
+        user_bucket = self._user_bucket(user)
+        user_wait = user_bucket.reserve(cost, CALENDAR_MAX_QUEUE_WAIT)
+        if user_wait is None:
+            REJECTED.inc(reason="user_rate")
+            raise CalendarOverloaded("Too many calendar requests for this user.", cost / user_bucket.rate)
+        global_wait = self.global_bucket.reserve(cost, CALENDAR_MAX_QUEUE_WAIT)
+        if global_wait is None:
+            user_bucket.refund(cost)
+            REJECTED.inc(reason="global_rate")
+            raise CalendarOverloaded("Calendar service is busy.", cost / self.global_bucket.rate)
+        wait = max(user_wait, global_wait)
+        if wait <= 0:
+            QUEUE_WAIT_SECONDS.observe(0.0)
+            return
+        with self._waiting_lock:
+            if self._waiting + self._queued >= CALENDAR_MAX_QUEUE:
+                user_bucket.refund(cost)
+                self.global_bucket.refund(cost)
+                REJECTED.inc(reason="queue_full")
+                raise CalendarOverloaded("Calendar request queue is full.", wait)
+            self._waiting += 1
+            QUEUE_DEPTH.set(self._waiting + self._queued)
+        try:
+            time.sleep(wait)
+        finally:
+            with self._waiting_lock:
+                self._waiting -= 1
+                QUEUE_DEPTH.set(self._waiting + self._queued)
+        QUEUE_WAIT_SECONDS.observe(wait)
+
+    def refund(self, user, cost=1):
+        """Give back an admission that ended up not being spent."""
+        self._user_bucket(user).refund(cost)
+        self.global_bucket.refund(cost)
+
+    def call(self, user, func, cost=1, admitted=False):
+        """Admit, run func(), and retry rate-limit errors with jittered backoff.
+
+        admitted=True means the caller already ran admit() for the first attempt.
+        """
+        for attempt in range(CALENDAR_MAX_RETRIES + 1):
+            if attempt or not admitted:
+                self.admit(user, cost)
+            try:
+                return func()
+            except Exception as e:
+                if not is_rate_limited(e):
+                    raise
+                status = e.resp.status
+                if attempt == CALENDAR_MAX_RETRIES:
+                    REJECTED.inc(reason=f"upstream_{status}")
+                    raise CalendarOverloaded("Calendar quota exceeded; try again shortly.", BACKOFF_CAP) from e
+                RETRIES.inc(status=status)
+                backoff(attempt)
+
+
+calendar_scheduler = CalendarScheduler()
@@ -0,0 +1,144 @@
+# agent/recurrence.py
+#
+# Client-side expansion of recurring events. Listing with singleEvents=False
+# returns each series once (the "master" with its RRULE/EXDATE/RDATE lines)
+# plus any individually modified or cancelled instances; this module turns
+# that back into the per-instance stream singleEvents=True would have
+# produced, lazily and in start order.
+
+import heapq
+import threading
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from cachetools import LRUCache
+from dateutil.rrule import rrulestr
+
+IST = timezone(timedelta(hours=5, minutes=30))
+
+_rules = LRUCache(maxsize=4096)
+_rules_lock = threading.Lock()
+
+
+def _parse_part(part):
+    """(datetime, all_day) for an event start/end/originalStartTime."""
+    if "dateTime" in part:
+        dt = datetime.fromisoformat(part["dateTime"].replace("Z", "+00:00"))
+        if part.get("timeZone"):
+            # Expand in the series' own zone so DST shifts land correctly.
+            dt = dt.astimezone(ZoneInfo(part["timeZone"]))
+        return dt, False
+    return datetime.fromisoformat(part["date"]), True
+
+
+def sort_key(event):
+    """Aware start timestamp; all-day events start at IST midnight."""
+    dt, all_day = _parse_part(event["start"])
+    return dt.replace(tzinfo=IST) if all_day else dt
+
+
+def _format_part(dt, all_day, time_zone=None):
+    if all_day:
+        return {"date": dt.date().isoformat()}
+    part = {"dateTime": dt.isoformat()}
+    if time_zone:
+        part["timeZone"] = time_zone
+    return part
+
+
+def _ruleset(master):
+    """Parsed rruleset for a master, cached on (id, updated)."""
+    key = (master["id"], master.get("updated"))
+    with _rules_lock:
+        rules = _rules.get(key)
+    if rules is None:
+        dtstart, _ = _parse_part(master["start"])
+        rules = rrulestr("\n".join(master["recurrence"]), dtstart=dtstart, forceset=True)
+        # Generating one occurrence surfaces bad UNTIL/EXDATE timezone mixes now
+        # rather than halfway through a merged stream.
+        next(iter(rules), None)
+        with _rules_lock:
+            _rules[key] = rules
+    return rules
+
+
+def _instance_id(master_id, occurrence, all_day):
+    stamp = occurrence.strftime("%Y%m%d") if all_day else occurrence.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    return f"{master_id}_{stamp}"
+
+
+def override_key(exception):
+    """(instance ID, original start) of a modified or cancelled instance of a series.
+
+    The ID is the one expand_master generates for that occurrence, so it can
+    be used as a key in `overrides`; all-day originals start at IST midnight.
+    """
+    original, all_day = _parse_part(exception.get("originalStartTime") or exception["start"])
+    return (_instance_id(exception["recurringEventId"], original, all_day),
+            original.replace(tzinfo=IST) if all_day else original)
+
+
+def expand_master(master, time_min, time_max, overrides=None):
+    """Yield instances of a recurring master overlapping [time_min, time_max).
+
+    overrides maps instance IDs to modified/cancelled exception events,
+    which replace (or suppress) the generated occurrence.
+    """
+    overrides = overrides or {}
+    start, all_day = _parse_part(master["start"])
+    end, _ = _parse_part(master["end"])
+    duration = end - start
+    time_zone = master["start"].get("timeZone")
+
+    if all_day:
+        # rrule works on naive dates here; compare in IST like the API does.
+        lo = time_min.astimezone(IST).replace(tzinfo=None) - duration
+        hi = time_max.astimezone(IST).replace(tzinfo=None)
+    else:
+        lo, hi = time_min - duration, time_max
+
+    for occurrence in _ruleset(master).xafter(lo, inc=False):
+        if occurrence >= hi:
+            return
+        instance_id = _instance_id(master["id"], occurrence, all_day)
+        if instance_id in overrides:
+            continue  # the exception itself is yielded with the one-off events
+        instance = {
+            "id": instance_id,
+            "summary": master.get("summary", ""),
+            "status": master.get("status", "confirmed"),
+            "transparency": master.get("transparency", "opaque"),
+            "recurringEventId": master["id"],
+            "start": _format_part(occurrence, all_day, time_zone),
+            "end": _format_part(occurrence + duration, all_day, time_zone),
+        }
+        if "attendees" in master:
+            # The user's RSVP to the series applies to each occurrence.
+            instance["attendees"] = master["attendees"]
+        yield instance
+
+
+def expand(items, time_min, time_max):
+    """Turn a singleEvents=False listing into sorted single instances.
+
+    One-off events and modified exceptions pass through; cancelled
+    exceptions only suppress their occurrence; masters are expanded lazily.
+    Everything is merged in start order, like orderBy=startTime.
+    """
+    masters, singles, overrides = [], [], {}
+    for event in items:
+        if event.get("recurrence"):
+            masters.append(event)
+        elif event.get("recurringEventId"):
+            overrides[override_key(event)[0]] = event
+            if event.get("status") != "cancelled":
+                singles.append(event)
+        elif event.get("status") != "cancelled":
+            singles.append(event)
+
+    for master in masters:
+        _ruleset(master)  # parse up front so unusable rules fail before anything is yielded
+
+    singles.sort(key=sort_key)
+    streams = [iter(singles)] + [expand_master(m, time_min, time_max, overrides) for m in masters]
+    return heapq.merge(*streams, key=sort_key)
@@ -0,0 +1,167 @@
+# agent/token_refresh.py
+#
+# Refreshes stored OAuth credentials shortly before they expire so that no
+# /chat request has to wait on the token endpoint. Workers sharing a session
+# store coordinate through it: one takes a lease on the user and refreshes,
+# the others adopt the token it publishes.
+
+import os
+import json
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+
+from google.auth.exceptions import RefreshError
+
+from agent.token_store import session_store
+from agent.calendar import update_cached_credentials, invalidate_calendar_service
+from agent.logs import fields
+
+log = logging.getLogger(__name__)
+
+# Refresh anything expiring within this many seconds...
+REFRESH_MARGIN = int(os.getenv("TOKEN_REFRESH_MARGIN", "300"))
+# ...checking the session store this often.
+REFRESH_INTERVAL = int(os.getenv("TOKEN_REFRESH_INTERVAL", "30"))
+# A worker refreshing a user holds the lease this long at most.
+REFRESH_LEASE = int(os.getenv("TOKEN_REFRESH_LEASE", "60"))
+REFRESH_LOCK_STRIPES = 64
+
+
+def _expiry(info):
+    raw = info.get("expiry")
+    if not raw:
+        return None
+    expiry = datetime.fromisoformat(raw.replace("Z", "+00:00"))
+    return expiry if expiry.tzinfo else expiry.replace(tzinfo=timezone.utc)
+
+
+def _user(info):
+    return hashlib.sha256((info.get("refresh_token") or "").encode("utf-8")).hexdigest()
+
+
+def freshest(stored: str, incoming: str) -> str:
+    """Of two tokens for the same user, the one that expires later.
+
+    Clients keep sending the token they were issued; this stops that from
+    overwriting a copy the scheduler has already refreshed.
+    """
+    if not stored or not incoming or stored == incoming:
+        return incoming or stored
+    try:
+        old, new = json.loads(stored), json.loads(incoming)
+    except ValueError:
+        return incoming
+    if not old.get("refresh_token") or old.get("refresh_token") != new.get("refresh_token"):
+        return incoming
+    old_exp, new_exp = _expiry(old), _expiry(new)
+    if old_exp and (new_exp is None or old_exp > new_exp):
+        return stored
+    return incoming
+
+
+class CredentialRefresher:
+    """Background thread that keeps every stored credential unexpired."""
+
+    def __init__(self, store=session_store, margin=REFRESH_MARGIN, interval=REFRESH_INTERVAL, lease=REFRESH_LEASE):
+        self.store = store
+        self.margin = timedelta(seconds=margin)
+        self.interval = interval
+        self.lease = lease
+        self.stats = {"refreshed": 0, "failed": 0}
+        # Striped so the lock table stays fixed-size however many users there are.
+        self._locks = [threading.Lock() for _ in range(REFRESH_LOCK_STRIPES)]
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _lock(self, user):
+        return self._locks[int(user[:8], 16) % len(self._locks)]
+
+    def due(self, token, now=None):
+        try:
+            info = json.loads(token)
+        except ValueError:
+            return False
+        expiry = _expiry(info)
+        now = now or datetime.now(timezone.utc)
+        return bool(info.get("refresh_token")) and expiry is not None and expiry - now <= self.margin
+
+    def refresh(self, token):
+        """Refresh token if due; single-flight per user across workers.
+
+        Returns the newest token JSON, or None once Google has rejected the
+        grant for good (revoked, expired, invalid_grant).
+        """
+        info = json.loads(token)
+        user = _user(info)
+        with self._lock(user):
+            latest = self.store.refreshed_token(user)
+            if latest and freshest(latest, token) == latest and not self.due(latest):
+                return latest  # another session or worker already refreshed this user
+            if not self.due(token):
+                return token
+            if not self.store.claim_refresh(user, self.lease):
+                return token  # another worker is refreshing; adopt its token next pass
+            latest = self.store.refreshed_token(user)
+            if latest and freshest(latest, token) == latest and not self.due(latest):
+                return latest  # published between our first look and the claim
+            from google.auth.transport.requests import Request as GoogleAuthRequest
+            from google.oauth2.credentials import Credentials
+            creds = Credentials.from_authorized_user_info(info, info.get("scopes"))
+            try:
+                creds.refresh(GoogleAuthRequest())
+            except RefreshError as e:
+                self.stats["failed"] += 1
+                if e.retryable:
+                    # The token endpoint had a bad moment; try again next pass.
+                    log.warning("token_refresh_failed", extra=fields(user=user[:12], error=str(e)))
+                    return token
+                # Revoked or otherwise dead; stop serving it from the cache.
+                log.warning("token_revoked", extra=fields(user=user[:12], error=str(e)))
+                invalidate_calendar_service(token)
+                return None
+            new_token = creds.to_json()
+            update_cached_credentials(token, new_token, creds)
+            self.store.save_refresh(user, new_token)
+            self.stats["refreshed"] += 1
+            return new_token
+
+    def run_once(self):
+        now = datetime.now(timezone.utc)
+        for session_id, token in list(self.store.items()):
+            if not self.due(token, now):
+                continue
+            try:
+                new_token = self.refresh(token)
+            except Exception:
+                log.exception("token_refresh_error", extra=fields(session_id=session_id))
+                self.stats["failed"] += 1
+                continue
+            if new_token is None:
+                # Retrying a dead grant would only hit the token endpoint again
+                # every lease until the session expires; the user must re-authorize.
+                self.store.delete(session_id)
+            elif new_token != token:
+                self.store.set(session_id, new_token)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                log.exception("token_refresh_pass_failed")
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="token-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+
+credential_refresher = CredentialRefresher()
@@ -1 +1,275 @@
-stored_token = {}
+# agent/token_store.py
+#
+# Per-session OAuth token storage. The in-memory backend is lock-striped so
+# concurrent users only contend when their session IDs hash to the same
+# stripe; the SQLite backend lets several uvicorn workers share sessions.
+# Both also keep a per-user refresh record (lease + latest refreshed token)
+# so only one worker refreshes a user's credentials and the rest adopt it,
+# and the single-use OAuth states /authorize has issued.
+
+import os
+import time
+import sqlite3
+import hashlib
+import secrets
+import threading
+from collections import OrderedDict
+
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")  # "memory" or "sqlite"
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", "sessions.sqlite3")
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(7 * 24 * 3600)))
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "100000"))
+SESSION_STRIPES = 64
+# How long a refreshed token is offered to the user's other sessions.
+REFRESH_RECORD_TTL = 3600
+# How long an issued OAuth state may take to come back to /callback.
+OAUTH_STATE_TTL = int(os.getenv("OAUTH_STATE_TTL", "600"))
+
+
+class MemoryBackend:
+    """Lock-striped LRU of session_id -> (token, expires_at)."""
+
+    def __init__(self, ttl=SESSION_TTL, max_entries=SESSION_MAX_ENTRIES, stripes=SESSION_STRIPES):
+        self.ttl = ttl
+        self._per_stripe = max(1, max_entries // stripes)
+        self._stripes = [(threading.Lock(), OrderedDict()) for _ in range(stripes)]
+        self._max_records = max_entries
+        self._refreshes = OrderedDict()  # user -> [token, refreshed_at, lease_until]
+        self._refreshes_lock = threading.Lock()
+        self._oauth_states = OrderedDict()  # state -> expires_at
+        self._oauth_states_lock = threading.Lock()
+
+    def _stripe(self, session_id):
+        h = int.from_bytes(hashlib.blake2b(session_id.encode(), digest_size=8).digest(), "big")
+        return self._stripes[h % len(self._stripes)]
+
+    def get(self, session_id):
+        lock, entries = self._stripe(session_id)
+        with lock:
+            item = entries.get(session_id)
+            if item is None:
+                return None
+            token, expires_at = item
+            if expires_at <= time.time():
+                del entries[session_id]
+                return None
+            entries.move_to_end(session_id)
+            return token
+
+    def set(self, session_id, token):
+        lock, entries = self._stripe(session_id)
+        with lock:
+            entries[session_id] = (token, time.time() + self.ttl)
+            entries.move_to_end(session_id)
+            while len(entries) > self._per_stripe:
+                entries.popitem(last=False)
+
+    def delete(self, session_id):
+        lock, entries = self._stripe(session_id)
+        with lock:
+            entries.pop(session_id, None)
+
+    def items(self):
+        now = time.time()
+        for lock, entries in self._stripes:
+            with lock:
+                snapshot = [(sid, token) for sid, (token, exp) in entries.items() if exp > now]
+            yield from snapshot
+
+    def __len__(self):
+        return sum(len(entries) for _, entries in self._stripes)
+
+    def claim_refresh(self, user, lease):
+        now = time.time()
+        with self._refreshes_lock:
+            record = self._refreshes.setdefault(user, [None, 0.0, 0.0])
+            self._refreshes.move_to_end(user)
+            while len(self._refreshes) > self._max_records:
+                self._refreshes.popitem(last=False)
+            if record[2] > now:
+                return False
+            record[2] = now + lease
+            return True
+
+    def save_refresh(self, user, token):
+        with self._refreshes_lock:
+            self._refreshes[user] = [token, time.time(), 0.0]
+            self._refreshes.move_to_end(user)
+            while len(self._refreshes) > self._max_records:
+                self._refreshes.popitem(last=False)
+
+    def refreshed_token(self, user):
+        with self._refreshes_lock:
+            record = self._refreshes.get(user)
+        if record is None or record[1] <= time.time() - REFRESH_RECORD_TTL:
+            return None
+        return record[0]
+
+    def add_oauth_state(self, state, ttl):
+        with self._oauth_states_lock:
+            self._oauth_states[state] = time.time() + ttl
+            while len(self._oauth_states) > self._max_records:
+                self._oauth_states.popitem(last=False)
+
+    def take_oauth_state(self, state):
+        with self._oauth_states_lock:
+            expires_at = self._oauth_states.pop(state, 0.0)
+        return expires_at > time.time()
+
+
+class SQLiteBackend:
+    """Sessions in a shared SQLite file (WAL) so every worker sees them."""
+
+    def __init__(self, path=SESSION_STORE_PATH, ttl=SESSION_TTL, max_entries=SESSION_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, token TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn().execute("CREATE INDEX IF NOT EXISTS sessions_by_expiry ON sessions (expires_at)")
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS refreshes ("
+            "user TEXT PRIMARY KEY, token TEXT, refreshed_at REAL NOT NULL DEFAULT 0, lease_until REAL NOT NULL)"
+        )
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS oauth_states (state TEXT PRIMARY KEY, expires_at REAL NOT NULL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id):
+        row = self._conn().execute(
+            "SELECT token FROM sessions WHERE session_id=? AND expires_at > ?", (session_id, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, session_id, token):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)", (session_id, token, time.time() + self.ttl)
+        )
+        self._writes += 1
+        if self._writes % 256 == 0:
+            self._prune(conn)
+
+    def _prune(self, conn):
+        conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),))
+        conn.execute(
+            "DELETE FROM sessions WHERE session_id IN ("
+            "SELECT session_id FROM sessions ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+        conn.execute(
+            "DELETE FROM refreshes WHERE refreshed_at <= ? AND lease_until <= ?",
+            (time.time() - REFRESH_RECORD_TTL, time.time()),
+        )
+        conn.execute("DELETE FROM oauth_states WHERE expires_at <= ?", (time.time(),))
+
+    def delete(self, session_id):
+        self._conn().execute("DELETE FROM sessions WHERE session_id=?", (session_id,))
+
+    def items(self):
+        return self._conn().execute(
+            "SELECT session_id, token FROM sessions WHERE expires_at > ?", (time.time(),)
+        ).fetchall()
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def claim_refresh(self, user, lease):
+        now = time.time()
+        cursor = self._conn().execute(
+            "INSERT INTO refreshes (user, lease_until) VALUES (?, ?) "
+            "ON CONFLICT(user) DO UPDATE SET lease_until=excluded.lease_until WHERE refreshes.lease_until <= ?",
+            (user, now + lease, now),
+        )
+        return cursor.rowcount == 1
+
+    def save_refresh(self, user, token):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO refreshes VALUES (?, ?, ?, 0)", (user, token, time.time())
+        )
+
+    def refreshed_token(self, user):
+        row = self._conn().execute(
+            "SELECT token FROM refreshes WHERE user=? AND refreshed_at > ?",
+            (user, time.time() - REFRESH_RECORD_TTL),
+        ).fetchone()
+        return row[0] if row else None
+
+    def add_oauth_state(self, state, ttl):
+        self._conn().execute("INSERT OR REPLACE INTO oauth_states VALUES (?, ?)", (state, time.time() + ttl))
+        self._writes += 1
+        if self._writes % 256 == 0:
+            self._prune(self._conn())
+
+    def take_oauth_state(self, state):
+        cursor = self._conn().execute(
+            "DELETE FROM oauth_states WHERE state=? AND expires_at > ?", (state, time.time())
+        )
+        return cursor.rowcount == 1
+
+
+def _default_backend():
+    if SESSION_STORE == "sqlite":
+        return SQLiteBackend()
+    return MemoryBackend()
+
+
+class SessionStore:
+    """session_id -> OAuth token JSON, with TTL and a bounded footprint."""
+
+    def __init__(self, backend=None):
+        # Not `backend or ...`: an empty backend is falsy through __len__.
+        self.backend = backend if backend is not None else _default_backend()
+
+    def get(self, session_id):
+        return self.backend.get(session_id) if session_id else None
+
+    def set(self, session_id, token):
+        self.backend.set(session_id, token)
+
+    def delete(self, session_id):
+        self.backend.delete(session_id)
+
+    def items(self):
+        return self.backend.items()
+
+    def __len__(self):
+        return len(self.backend)
+
+    def claim_refresh(self, user, lease):
+        """True if this worker may refresh `user` now; False while another holds the lease."""
+        return self.backend.claim_refresh(user, lease)
+
+    def save_refresh(self, user, token):
+        """Publish `user`'s refreshed token to every worker and release the lease."""
+        self.backend.save_refresh(user, token)
+
+    def refreshed_token(self, user):
+        """The token most recently refreshed for `user` by any worker, if recent."""
+        return self.backend.refreshed_token(user)
+
+    def issue_oauth_state(self, ttl=OAUTH_STATE_TTL):
+        """A new random OAuth state, valid for one /callback within `ttl` seconds."""
+        state = secrets.token_urlsafe(32)
+        self.backend.add_oauth_state(state, ttl)
+        return state
+
+    def consume_oauth_state(self, state):
+        """True (once) if `state` was issued here and hasn't expired."""
+        return bool(state) and self.backend.take_oauth_state(state)
+
+
+session_store = SessionStore()
@@ -53,26 +53,70 @@
 import traceback
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse, JSONResponse
-from google_auth_oauthlib.flow import Flow
-from agent.langgraph_flow import langgraph_agent
+from fastapi.responses import RedirectResponse, JSONResponse, StreamingResponse, PlainTextResponse
+from contextlib import asynccontextmanager
+from agent.langgraph_flow import langgraph_agent, abook_batch, get_chain, IST
+from agent.model_router import model_router
+from agent.conversations import open_checkpointer, thread_config, turn_state, conversation_pruner, token_var
+from agent.rate_limit import CalendarOverloaded
+from agent.prefetch import start_prefetch, cancel_prefetch, stats as prefetch_stats
 from pydantic import BaseModel
 from dotenv import load_dotenv
 import os
 from agent.oauth_utils import get_google_flow
-from agent.token_store import stored_token
+from agent.token_store import session_store, OAUTH_STATE_TTL
+from agent.token_refresh import credential_refresher, freshest
+from agent.calendar import service_cache_stats, coalescing_stats, warmup
+from agent.fast_parser import fast_path_stats
+from agent.llm_cache import llm_cache
+from agent.conflicts import conflict_guard
+from agent.metrics import registry, Gauge, CollectedCounter, REQUEST_SECONDS, FIRST_EVENT_SECONDS, trace_id_var
+from agent.logs import configure_logging, fields
+import logging
 import traceback
 import json
+import time
+import uuid
+import secrets
 
 
 
 
 
 
-app = FastAPI()
-graph = langgraph_agent()
 load_dotenv()
 
+configure_logging()
+log = logging.getLogger(__name__)
+
+# Compiled once in the lifespan below, not at import.
+graph = None
+checkpointer = None
+WARMUP = os.getenv("WARMUP", "1") == "1"
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Build the model chain and graph once per worker, warm the Google
+    client stack, and run the credential refresher and the conversation
+    checkpointer for the app's lifetime."""
+    global graph, checkpointer
+    get_chain()
+    get_chain(fallback=True)
+    async with open_checkpointer() as checkpointer:
+        graph = langgraph_agent(checkpointer=checkpointer)
+        if WARMUP:
+            try:
+                warmup()
+            except Exception as e:
+                log.warning("warmup_failed", extra=fields(error=str(e)))
+        credential_refresher.start()
+        yield
+        credential_refresher.stop()
+
+
+app = FastAPI(lifespan=lifespan)
+
 # backend/main.py
 
 REQUIRED_ENV_VARS = ["GOOGLE_CLIENT_ID", "GOOGLE_CLIENT_SECRET", "GOOGLE_REDIRECT_URI", "GEMINI_API_KEY"]
@@ -94,72 +138,373 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+CACHE_STATS = registry.register(CollectedCounter(
+    "cache_events_total", "Hit/miss counters of the in-process caches.", ("cache", "event")))
+
+
+def _collect_cache_stats():
+    for cache, stats in (
+        ("calendar_service", service_cache_stats()),
+        ("fast_path", fast_path_stats()),
+        ("llm", llm_cache.stats),
+    ):
+        for event in ("hits", "misses"):
+            CACHE_STATS.set(stats[event], cache=cache, event=event)
+
+
+registry.add_collector(_collect_cache_stats)
+
+BOOKINGS = registry.register(CollectedCounter(
+    "bookings_total", "Conflict-checked bookings by outcome (booked, rescheduled, conflicts, index seeds).", ("outcome",)))
+registry.add_collector(lambda: [
+    BOOKINGS.set(count, outcome=outcome) for outcome, count in conflict_guard.stats.items()
+])
+
+COALESCED_READS = registry.register(CollectedCounter(
+    "calendar_reads_total", "Calendar reads by how they were served.", ("served_by",)))
+registry.add_collector(lambda: [
+    COALESCED_READS.set(count, served_by=kind) for kind, count in coalescing_stats().items()
+])
+
+PREFETCHES = registry.register(CollectedCounter(
+    "calendar_prefetches_total", "Speculative busy-interval reads by outcome.", ("outcome",)))
+registry.add_collector(lambda: [
+    PREFETCHES.set(count, outcome=outcome) for outcome, count in prefetch_stats.items()
+])
+
+MODEL_ROUTER = registry.register(Gauge(
+    "model_router", "Hedged model calls: calls, hedged, hedge_wins, fallback_routed, deadline_exceeded, "
+    "hedge_rate, hedge_win_rate, hedge_after_seconds.", ("stat",)))
+MODEL_BREAKER_OPEN = registry.register(Gauge(
+    "model_breaker_open", "1 while the primary model's circuit breaker is open or half-open."))
+
+
+def _collect_model_router():
+    snapshot = model_router.snapshot()
+    for stat, value in snapshot.items():
+        if stat != "breaker":
+            MODEL_ROUTER.set(value, stat=stat)
+    MODEL_BREAKER_OPEN.set(0 if snapshot["breaker"] == "closed" else 1)
+
+
+registry.add_collector(_collect_model_router)
+
+TOKEN_REFRESHES = registry.register(CollectedCounter(
+    "token_refreshes_total", "Background credential refreshes.", ("outcome",)))
+registry.add_collector(lambda: [
+    TOKEN_REFRESHES.set(credential_refresher.stats["refreshed"], outcome="ok"),
+    TOKEN_REFRESHES.set(credential_refresher.stats["failed"], outcome="error"),
+])
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Give every request a trace ID (or reuse X-Request-ID) and echo it back."""
+    trace_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    trace_id_var.set(trace_id)
+    response = await call_next(request)
+    response.headers["X-Trace-ID"] = trace_id
+    return response
+
+
+def _observe_request(endpoint, started, intent, outcome):
+    REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint, intent=intent or "unknown", outcome=outcome)
+
+
+def _overloaded(e):
+    """503 with Retry-After for requests shed by Calendar admission control."""
+    return JSONResponse(
+        status_code=503,
+        content={"response": f"⏳ {e} Please try again in a moment.", "type": "overloaded"},
+        headers={"Retry-After": str(max(1, round(e.retry_after)))},
+    )
+
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 def root():
     return {"message": "Booking Agent API is running!"}
 
+@app.get("/stats/service-cache")
+def service_cache():
+    return service_cache_stats()
+
+@app.get("/stats/fast-path")
+def fast_path():
+    return fast_path_stats()
+
+@app.get("/stats/llm-cache")
+def llm_cache_stats():
+    return llm_cache.stats
+
+@app.get("/stats/model-router")
+def model_router_stats():
+    return model_router.snapshot()
+
+def _session_id(request: Request, body: dict):
+    """Session ID from the body or X-Session-ID header; None when the client sent neither."""
+    return body.get("session_id") or request.headers.get("X-Session-ID")
+
+
+def _conversation_id(body, session_id):
+    """Checkpoint thread for this chat: an explicit conversation_id, else the session, else a new one."""
+    return body.get("conversation_id") or session_id or uuid.uuid4().hex
+
+
+async def _run_turn(state, conversation_id):
+    """One graph turn on the conversation's thread, then bound its stored history."""
+    result = await graph.ainvoke(state, thread_config(conversation_id), checkpoint_during=False)
+    await conversation_pruner.after_turn(checkpointer, conversation_id)
+    return result
+
+
+def _resolve_token(session_id, token):
+    """Remember a token sent with the request, else fall back to the session's.
+
+    A copy already refreshed in the background wins over the stale one
+    the client keeps sending. Without a session ID nothing is stored.
+    """
+    if session_id is None:
+        return token
+    stored = session_store.get(session_id)
+    token = freshest(stored, token)
+    if token and token != stored:
+        session_store.set(session_id, token)
+    return token
+
+
 @app.post("/chat/token")
-async def receive_token(token_data: dict):
-    print("📥 Received token at backend:", token_data)
-    stored_token["token"] = json.dumps(token_data) # This correctly stores the stringified JSON
-    return {"status": "success"}
+async def receive_token(request: Request, token_data: dict):
+    session_id = _session_id(request, token_data) or uuid.uuid4().hex
+    token = token_data.get("token")
+    if not isinstance(token, str):
+        token = json.dumps(token_data)
+    _resolve_token(session_id, token)
+    log.info("token_received", extra=fields(session_id=session_id))
+    return {"status": "success", "session_id": session_id}
+
+# Binds an issued OAuth state to the browser that started the flow.
+OAUTH_STATE_COOKIE = "oauth_state"
+
 
 @app.get("/authorize")
 def authorize():
+    """Redirect to Google's consent page with a single-use, server-issued OAuth state.
+
+    The state also goes into a cookie, so /callback only completes the flow
+    for the browser that started it.
+    """
+    state = session_store.issue_oauth_state()
     flow = get_google_flow()
-    auth_url, _ = flow.authorization_url(prompt='consent')
-    return RedirectResponse(auth_url)
+    auth_url, _ = flow.authorization_url(prompt='consent', state=state)
+    response = RedirectResponse(auth_url)
+    response.set_cookie(OAUTH_STATE_COOKIE, state, max_age=OAUTH_STATE_TTL, httponly=True, samesite="lax")
+    return response
+
+
+def _unauthenticated():
+    return JSONResponse(status_code=401, content={"response": "❌ No token found! User must authenticate first."})
 
 # In your /chat endpoint, add better error logging:
 @app.post("/chat")
 async def chat_endpoint(request: Request):
+    started = time.perf_counter()
     try:
         body = await request.json()
         message = body.get("message", "").strip()
-        token = body.get("token")  # ✅ Token from frontend (optional)
+        session_id = _session_id(request, body)
+        conversation_id = _conversation_id(body, session_id)
+        # ✅ Token from frontend (optional); otherwise the session's stored one
+        token = _resolve_token(session_id, body.get("token"))
 
         if not message:
             return JSONResponse(status_code=400, content={"response": "Message cannot be empty."})
-
-        print("🟡 Received message:", message)
-
-        # ✅ Store token if provided (for future use)
-        if token:
-            stored_token["token"] = token
-            print("🔐 Token saved from incoming request")
-
-        # ✅ DEBUG: Show current stored token state
-        print("🧪 Current stored token:", stored_token.get("token"))
-
-        # Initial state for LangGraph
-        initial_state = {
-        "input": message,
-        "token": token,
-        "intent": "",
-        "summary": "",
-        "start_time": "",
-        "duration_minutes": 0,
-        "output": ""
-    }
-
-        print("🔍 Invoking LangGraph with initial_state:", initial_state)
-        result = graph.invoke(initial_state)
-        print("✅ LangGraph result:", result)
-
+        if not token:
+            return _unauthenticated()
+
+        # Only this turn's input; earlier turns' intent and times come from the checkpoint.
+        state = turn_state(message, trace_id_var.get())
+        token_var.set(token)
+
+        log.debug("graph_invoke", extra=fields(state=state, conversation_id=conversation_id))
+        # Busy intervals are read while the model works out the intent.
+        start_prefetch(token, IST)
+        try:
+            result = await _run_turn(state, conversation_id)
+        finally:
+            cancel_prefetch()
+        log.debug("graph_result", extra=fields(state=result))
+
+        _observe_request("chat", started, result.get("intent"), "error" if result.get("intent") == "error" else "ok")
         if result.get("intent") == "error":
             return JSONResponse(
                 status_code=400,
                 content={
                     "response": result.get("output", "Agent error."),
-                    "type": "agent_error"
+                    "type": "agent_error",
+                    "conversation_id": conversation_id
                 }
             )
 
-        return {"response": result.get("output", "✅ Request processed but no output.")}
+        return {"response": result.get("output", "✅ Request processed but no output."), "conversation_id": conversation_id}
 
+    except CalendarOverloaded as e:
+        _observe_request("chat", started, "unknown", "overloaded")
+        return _overloaded(e)
+    except Exception as e:
+        log.exception("chat_failed")
+        _observe_request("chat", started, "unknown", "exception")
+
+        return JSONResponse(
+            status_code=500,
+            content={
+                "response": f"❌ Internal Server Error: {str(e)}",
+                "type": type(e).__name__,
+                "trace": traceback.format_exc()
+            }
+        )
+
+
+GRAPH_NODES = {"input", "book", "check", "schedule", "find_slot", "error_handler"}
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: Request):
+    """Server-sent-events variant of /chat.
+
+    Emits "accepted" immediately, "node" when each graph node starts/ends,
+    "token" for model output chunks, "intent" once the input node has
+    parsed the message, then "result" and "done". Every event carries
+    elapsed_ms since the request arrived. The delay to the first "token"
+    or "intent" (the first event with content) is recorded in
+    chat_stream_first_event_seconds.
+    """
+    body = await request.json()
+    message = body.get("message", "").strip()
+    session_id = _session_id(request, body)
+    conversation_id = _conversation_id(body, session_id)
+    token = _resolve_token(session_id, body.get("token"))
+
+    if not message:
+        return JSONResponse(status_code=400, content={"response": "Message cannot be empty."})
+    if not token:
+        return _unauthenticated()
+
+    state = turn_state(message, trace_id_var.get())
+    started = time.perf_counter()
+
+    async def events():
+        def elapsed():
+            return round((time.perf_counter() - started) * 1000, 1)
+
+        first_event = None
+
+        def content_event(event, data):
+            nonlocal first_event
+            if first_event is None:
+                first_event = event
+                FIRST_EVENT_SECONDS.observe(time.perf_counter() - started, event=event)
+            return _sse(event, data)
+
+        yield _sse("accepted", {"elapsed_ms": elapsed()})
+        result = None
+        token_var.set(token)
+        start_prefetch(token, IST)
+        try:
+            async for event in graph.astream_events(
+                    state, thread_config(conversation_id), version="v2", checkpoint_during=False):
+                kind = event["event"]
+                name = event.get("name")
+                if kind == "on_chat_model_stream":
+                    chunk = event["data"]["chunk"].content
+                    if chunk:
+                        yield content_event("token", {"text": chunk, "elapsed_ms": elapsed()})
+                elif name in GRAPH_NODES and kind in ("on_chain_start", "on_chain_end"):
+                    status = "start" if kind == "on_chain_start" else "end"
+                    yield _sse("node", {"node": name, "status": status, "elapsed_ms": elapsed()})
+                    if name == "input" and status == "end":
+                        parsed = event["data"].get("output") or {}
+                        yield content_event("intent", {
+                            "intent": parsed.get("intent"),
+                            "summary": parsed.get("summary"),
+                            "start_time": parsed.get("start_time"),
+                            "end_time": parsed.get("end_time"),
+                            "duration_minutes": parsed.get("duration_minutes"),
+                            "elapsed_ms": elapsed(),
+                        })
+                    if status == "end":
+                        result = event["data"].get("output") or result
+            result = result or {}
+            await conversation_pruner.after_turn(checkpointer, conversation_id)
+            _observe_request("chat_stream", started, result.get("intent"), "error" if result.get("intent") == "error" else "ok")
+            yield _sse("result", {
+                "response": result.get("output", "✅ Request processed but no output."),
+                "type": "agent_error" if result.get("intent") == "error" else "ok",
+                "conversation_id": conversation_id,
+                "elapsed_ms": elapsed(),
+            })
+        except CalendarOverloaded as e:
+            _observe_request("chat_stream", started, "unknown", "overloaded")
+            yield _sse("result", {
+                "response": f"⏳ {e} Please try again in a moment.",
+                "type": "overloaded",
+                "retry_after": e.retry_after,
+                "elapsed_ms": elapsed(),
+            })
+        except Exception as e:
+            log.exception("chat_stream_failed")
+            _observe_request("chat_stream", started, "unknown", "exception")
+            yield _sse("result", {
+                "response": f"❌ Internal Server Error: {str(e)}",
+                "type": type(e).__name__,
+                "elapsed_ms": elapsed(),
+            })
+        finally:
+            cancel_prefetch()
+        yield _sse("done", {"elapsed_ms": elapsed()})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/chat/batch")
+async def chat_batch_endpoint(request: Request):
+    started = time.perf_counter()
+    try:
+        body = await request.json()
+        messages = [m.strip() for m in body.get("messages", []) if isinstance(m, str) and m.strip()]
+        token = _resolve_token(_session_id(request, body), body.get("token"))
+
+        if not messages:
+            return JSONResponse(status_code=400, content={"response": "messages must be a non-empty list."})
+        if not token:
+            return _unauthenticated()
+
+        results = await abook_batch(messages, token)
+        booked = sum(1 for r in results if r["status"] == "booked")
+        _observe_request("chat_batch", started, "booking", "ok" if booked == len(results) else "partial")
+        return {
+            "booked": booked,
+            "failed": len(results) - booked,
+            "results": results,
+        }
+
+    except CalendarOverloaded as e:
+        _observe_request("chat_batch", started, "booking", "overloaded")
+        return _overloaded(e)
     except Exception as e:
-        print("❌ Exception occurred during /chat processing")
-        traceback.print_exc()
+        log.exception("chat_batch_failed")
+        _observe_request("chat_batch", started, "booking", "exception")
 
         return JSONResponse(
             status_code=500,
@@ -172,10 +517,18 @@ async def chat_endpoint(request: Request):
 
     
 @app.get("/callback")
-async def callback(code: str):
+async def callback(request: Request, code: str, state: str = None):
+    # The state must be one we issued, to this browser, and unused. It is never
+    # a session ID: the session is new and chosen here, so no one who handed
+    # out the consent link can know it.
+    if request.cookies.get(OAUTH_STATE_COOKIE) != state or not session_store.consume_oauth_state(state):
+        return JSONResponse(status_code=400, content={"response": "❌ Invalid or expired OAuth state. Please authorize again."})
     flow = get_google_flow()
     flow.fetch_token(code=code)
     creds = flow.credentials
     token_json = creds.to_json()
-    stored_token["token"] = token_json
-    return {"token": token_json}  # ✅ Ensure this returns JSON
+    session_id = secrets.token_urlsafe(32)
+    session_store.set(session_id, token_json)
+    response = JSONResponse({"token": token_json, "session_id": session_id})  # ✅ Ensure this returns JSON
+    response.delete_cookie(OAUTH_STATE_COOKIE)
+    return response
@@ -0,0 +1,71 @@
+# benchmarks/concurrency.py
+#
+# Shows /chat throughput scaling with in-flight requests once the graph runs
+# through graph.ainvoke. Gemini and Google Calendar are replaced by sleeps so
+# the numbers only reflect how well the pipeline overlaps waiting.
+#
+#   python -m benchmarks.concurrency --llm-latency 0.3 --calendar-latency 0.15
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import agent.calendar as calendar
+from agent.availability import BusyIntervals
+import agent.langgraph_flow as flow
+from benchmarks.fakes import FakeIntentModel
+
+CHECK_RESPONSE = json.dumps({"intent": "check_availability", "summary": "", "start_time": "", "duration_minutes": 30})
+
+
+def patch_dependencies(llm_latency, calendar_latency):
+    flow.model = FakeIntentModel(latency=llm_latency, response=CHECK_RESPONSE)
+
+    def fake_get_busy_intervals(token, time_min, time_max, calendar_ids=None):
+        time.sleep(calendar_latency)
+        return BusyIntervals()
+
+    calendar.get_busy_intervals = fake_get_busy_intervals
+
+
+async def run_level(graph, concurrency, total):
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with sem:
+            flow.token_var.set("{}")
+            await graph.ainvoke({
+                "input": "what does my day look like?", "intent": "",
+                "summary": "", "start_time": "", "end_time": "", "duration_minutes": 0, "output": ""
+            })
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+    return total / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--calendar-latency", type=float, default=0.15)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--levels", default="1,2,4,8,16,32")
+    args = parser.parse_args()
+
+    patch_dependencies(args.llm_latency, args.calendar_latency)
+    graph = flow.langgraph_agent()
+
+    print(f"{'in-flight':>10} {'req/s':>10}")
+    for level in [int(x) for x in args.levels.split(",")]:
+        rps = asyncio.run(run_level(graph, level, args.requests))
+        print(f"{level:>10} {rps:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
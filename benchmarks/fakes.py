@@ -0,0 +1,183 @@
+# benchmarks/fakes.py
+#
+# Local stand-ins for Gemini and the Google Calendar API so the graph and
+# backend can be exercised without network access or credentials.
+
+import itertools
+import json
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlparse, parse_qs, unquote
+
+import httplib2
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+IST = timezone(timedelta(hours=5, minutes=30))
+
+FAKE_TOKEN = json.dumps({
+    "token": "fake-access-token",
+    "refresh_token": "fake-refresh-token",
+    "client_id": "fake-client-id",
+    "client_secret": "fake-client-secret",
+    "token_uri": "https://oauth2.googleapis.com/token",
+})
+
+
+# Hours of the day FakeCalendar never seeds (seeds start at 01:00, 04:00, ...).
+FREE_HOURS = [h for h in range(24) if h % 3 != 1]
+_booking_slots = itertools.count()
+
+
+def next_free_slot():
+    """A distinct 30-minute slot clear of FakeCalendar's seeded events, from tomorrow on."""
+    n = next(_booking_slots)
+    day = datetime.now(IST).replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1 + n // len(FREE_HOURS))
+    return day.replace(hour=FREE_HOURS[n % len(FREE_HOURS)])
+
+
+class FakeIntentModel(BaseChatModel):
+    """Chat model that sleeps for `latency` seconds and answers with intent JSON.
+
+    Messages containing "book" become bookings of the next free slot (see
+    next_free_slot), so concurrent bookings do not all collide; anything
+    else is an availability question. `response` overrides the answer.
+    """
+
+    latency: float = 0.3
+    response: str = ""
+
+    @property
+    def _llm_type(self):
+        return "fake-intent"
+
+    def _answer(self, messages):
+        if self.response:
+            return self.response
+        text = messages[-1].content.lower()
+        query = text.split("user query:", 1)[-1].split("\n", 1)[0]
+        tomorrow = (datetime.now(IST) + timedelta(days=1)).strftime("%Y-%m-%d")
+        if "book" in query:
+            return json.dumps({"intent": "booking", "summary": "Meeting",
+                               "start_time": next_free_slot().strftime("%Y-%m-%dT%H:%M:%S"), "duration_minutes": 30})
+        return json.dumps({"intent": "check_availability", "summary": "",
+                           "start_time": f"{tomorrow}T00:00:00", "end_time": f"{tomorrow}T23:59:00",
+                           "duration_minutes": 30})
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._answer(messages)))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        import asyncio
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._answer(messages)))])
+
+
+def _parse_ts(value):
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+class FakeCalendar:
+    """In-memory calendar store behind an httplib2-compatible transport.
+
+    Supports events.list (timeMin/timeMax, paging, syncToken), events.insert,
+    events.patch and freebusy.query. Every request sleeps for `latency` seconds. Seeded
+    events run 45 minutes from 01:00, 04:00, 07:00, ... IST starting today.
+    """
+
+    def __init__(self, latency=0.05, seed_events=200, page_size=250):
+        self.latency = latency
+        self.page_size = page_size
+        self.events = {}
+        self.requests = {"list": 0, "insert": 0, "patch": 0, "freebusy": 0}
+        self._lock = threading.Lock()
+        start = datetime.now(IST).replace(hour=0, minute=0, second=0, microsecond=0)
+        for i in range(seed_events):
+            s = start + timedelta(hours=3 * i + 1)
+            self._add({
+                "summary": f"Seeded event {i}",
+                "start": {"dateTime": s.isoformat()},
+                "end": {"dateTime": (s + timedelta(minutes=45)).isoformat()},
+            })
+
+    def _add(self, body):
+        event_id = uuid.uuid4().hex
+        event = {**body, "id": event_id, "status": "confirmed",
+                 "htmlLink": f"https://calendar.example/event?eid={event_id}"}
+        self.events[event_id] = event
+        return event
+
+    def http(self):
+        return _FakeHttp(self)
+
+    def _list(self, query):
+        self.requests["list"] += 1
+        items = sorted(self.events.values(), key=lambda e: e["start"]["dateTime"])
+        if "timeMin" in query:
+            t = _parse_ts(query["timeMin"])
+            items = [e for e in items if _parse_ts(e["end"]["dateTime"]) > t]
+        if "timeMax" in query:
+            t = _parse_ts(query["timeMax"])
+            items = [e for e in items if _parse_ts(e["start"]["dateTime"]) < t]
+        size = min(int(query.get("maxResults", self.page_size)), self.page_size)
+        offset = int(query.get("pageToken", 0))
+        page = items[offset:offset + size]
+        result = {"items": page}
+        if offset + size < len(items):
+            result["nextPageToken"] = str(offset + size)
+        else:
+            result["nextSyncToken"] = "sync-" + uuid.uuid4().hex
+        return result
+
+    def _freebusy(self, body):
+        self.requests["freebusy"] += 1
+        t_min, t_max = _parse_ts(body["timeMin"]), _parse_ts(body["timeMax"])
+        busy = [
+            {"start": e["start"]["dateTime"], "end": e["end"]["dateTime"]}
+            for e in self.events.values()
+            if _parse_ts(e["start"]["dateTime"]) < t_max and _parse_ts(e["end"]["dateTime"]) > t_min
+        ]
+        return {"calendars": {item["id"]: {"busy": busy} for item in body.get("items", [])}}
+
+    def handle(self, uri, method, body):
+        time.sleep(self.latency)
+        parsed = urlparse(uri)
+        query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        path = unquote(parsed.path)
+        with self._lock:
+            if path.endswith("/freeBusy"):
+                return 200, self._freebusy(json.loads(body))
+            if re.search(r"/calendars/[^/]+/events$", path):
+                if method == "POST":
+                    self.requests["insert"] += 1
+                    return 200, self._add(json.loads(body))
+                return 200, self._list(query)
+            match = re.search(r"/calendars/[^/]+/events/([^/]+)$", path)
+            if match and method == "PATCH" and match.group(1) in self.events:
+                self.requests["patch"] += 1
+                self.events[match.group(1)].update(json.loads(body))
+                return 200, self.events[match.group(1)]
+        return 404, {"error": {"code": 404, "message": f"fake calendar: no route for {method} {path}"}}
+
+
+class _FakeHttp:
+    """Just enough of httplib2.Http for googleapiclient.HttpRequest."""
+
+    def __init__(self, calendar):
+        self.calendar = calendar
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=None, connection_type=None):
+        status, payload = self.calendar.handle(uri, method, body)
+        return httplib2.Response({"status": status, "content-type": "application/json"}), json.dumps(payload).encode()
+
+
+def install_fake_calendar(calendar):
+    """Route every Calendar service built by agent.calendar through `calendar`."""
+    import agent.calendar as agent_calendar
+    agent_calendar._CachedService._http = lambda self: calendar.http()
+    agent_calendar.clear_service_cache()
@@ -0,0 +1,111 @@
+# benchmarks/fast_path_agreement.py
+#
+# Runs a corpus of messages through the rule-based fast path and, for every
+# message it claims, through the Gemini path too, then reports hit rate and
+# how often both produce the same AgentState fields. Needs GEMINI_API_KEY.
+#
+#   python -m benchmarks.fast_path_agreement [corpus.txt] [--min-agreement 0.95]
+#
+# --record asks the model about every corpus message (claimed or not) and
+# saves its answers with the time they were asked at, for comparing with
+# the hand-written golden expectations in tests/fixtures/fast_path_expected.json
+# that the offline test tests/test_fast_path_expectations.py checks against.
+#
+#   python -m benchmarks.fast_path_agreement --record model_outputs.json
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import agent.langgraph_flow as flow
+from agent.fast_parser import fast_parse
+
+COMPARED_FIELDS = ("intent", "start_time", "end_time", "duration_minutes")
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "fast_path_corpus.txt")
+
+
+def load_corpus(path=DEFAULT_CORPUS):
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def disagreement(message, fast, model_parsed, now_ist):
+    """Fields where the fast path's AgentState differs from the model's; {} if they agree."""
+    state = {"input": message}
+    fast_state = flow._apply_parsed(dict(state), fast, now_ist)
+    if isinstance(model_parsed, dict):
+        model_state = flow._apply_parsed(dict(state), model_parsed, now_ist)
+    else:
+        model_state = flow._apply_model_output(dict(state), model_parsed, now_ist)
+    return {
+        k: (fast_state.get(k), model_state.get(k))
+        for k in COMPARED_FIELDS
+        # The model may leave end_time empty for bookings; only compare it for availability.
+        if fast_state.get(k) != model_state.get(k) and not (k == "end_time" and fast["intent"] == "booking")
+    }
+
+
+def _ask_model(chain, message, now_ist):
+    """The model's answer as a dict, or the raw text when it isn't JSON."""
+    response = chain.invoke(flow._prompt_inputs({"input": message}, now_ist))
+    try:
+        return json.loads(response.content)
+    except json.JSONDecodeError:
+        return response.content
+
+
+def record(messages, path, now_ist):
+    chain = flow.get_chain("json")
+    outputs = {message: _ask_model(chain, message, now_ist) for message in messages}
+    with open(path, "w") as f:
+        json.dump({"now": now_ist.isoformat(), "outputs": outputs}, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    print(f"recorded {len(outputs)} model answers to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("corpus", nargs="?", default=DEFAULT_CORPUS)
+    parser.add_argument("--min-agreement", type=float, default=0.95)
+    parser.add_argument("--record", metavar="PATH", help="save the model's answers for every message here")
+    args = parser.parse_args()
+
+    messages = load_corpus(args.corpus)
+    now_ist = datetime.now(flow.IST)
+    if args.record:
+        record(messages, args.record, now_ist)
+        return
+
+    chain = flow.get_chain("json")
+    hits, agree, disagreements = 0, 0, []
+
+    for message in messages:
+        fast = fast_parse(message, now_ist)
+        if fast is None:
+            continue
+        hits += 1
+        diff = disagreement(message, fast, _ask_model(chain, message, now_ist), now_ist)
+        if diff:
+            disagreements.append((message, diff))
+        else:
+            agree += 1
+
+    agreement = agree / hits if hits else 1.0
+    print(json.dumps({
+        "messages": len(messages),
+        "fast_path_hits": hits,
+        "hit_rate": hits / len(messages) if messages else 0.0,
+        "agreement": agreement,
+    }, indent=2))
+    for message, diff in disagreements:
+        print(f"✗ {message!r}: " + ", ".join(f"{k}: fast={a!r} model={b!r}" for k, (a, b) in diff.items()))
+
+    sys.exit(0 if agreement >= args.min_agreement else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+# benchmarks/harness.py
+#
+# Offline load test for backend.main:app. Gemini and Google Calendar are
+# replaced by benchmarks.fakes, requests go through httpx's ASGI transport
+# at a fixed concurrency, and the run is summarised as latency percentiles,
+# throughput and per-node timings. Results can be saved as a JSON baseline
+# and later runs diffed against it.
+#
+#   python -m benchmarks.harness --concurrency 16 --requests 400 --output bench.json
+#   python -m benchmarks.harness --baseline bench.json --max-regression 0.10
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# backend.main refuses to start without these; none of them are used offline.
+for var in ("GOOGLE_CLIENT_ID", "GOOGLE_CLIENT_SECRET", "GOOGLE_REDIRECT_URI", "GEMINI_API_KEY"):
+    os.environ.setdefault(var, "offline-benchmark")
+os.environ.setdefault("EVENT_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "events.sqlite3"))
+os.environ.setdefault("CHECKPOINT_PATH", os.path.join(tempfile.mkdtemp(), "checkpoints.sqlite3"))
+
+import httpx
+
+import agent.langgraph_flow as flow
+from benchmarks.fakes import FakeCalendar, FakeIntentModel, FAKE_TOKEN, install_fake_calendar
+
+node_timings = defaultdict(list)
+
+
+def _timed(name, func):
+    async def wrapper(state):
+        start = time.perf_counter()
+        try:
+            return await func(state)
+        finally:
+            node_timings[name].append((time.perf_counter() - start) * 1000)
+    return wrapper
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(latencies):
+    return {
+        "count": len(latencies),
+        "mean_ms": statistics.fmean(latencies) if latencies else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+    }
+
+
+def setup(args):
+    """Swap in the fakes; must run before backend.main is imported."""
+    flow.model = FakeIntentModel(latency=args.llm_latency)
+    flow.ahandle_input = _timed("input", flow.ahandle_input)
+    flow.ahandle_booking = _timed("book", flow.ahandle_booking)
+    flow.ahandle_availability = _timed("check", flow.ahandle_availability)
+    flow.ahandle_schedule = _timed("schedule", flow.ahandle_schedule)
+    calendar = FakeCalendar(latency=args.calendar_latency, seed_events=args.seed_events)
+    install_fake_calendar(calendar)
+    return calendar
+
+
+async def drive(app, args):
+    latencies, statuses = [], defaultdict(int)
+    sem = asyncio.Semaphore(args.concurrency)
+    transport = httpx.ASGITransport(app=app)
+
+    # ASGITransport doesn't run the lifespan, which is where the graph is built.
+    async with app.router.lifespan_context(app), \
+            httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def one(i):
+            # Unique wording keeps the fast path and the LLM cache out of the way
+            # unless --realistic asks for repeated phrasings.
+            if i % 100 < args.booking_pct:
+                message = "book a meeting with the team" if args.realistic else f"book a meeting with team {i}"
+            else:
+                message = "what does tomorrow look like" if args.realistic else f"what does tomorrow look like #{i}"
+            async with sem:
+                start = time.perf_counter()
+                res = await client.post("/chat", json={"message": message, "token": FAKE_TOKEN})
+                latencies.append((time.perf_counter() - start) * 1000)
+                statuses[res.status_code] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(args.requests)))
+        elapsed = time.perf_counter() - started
+
+    return latencies, dict(statuses), elapsed
+
+
+def compare(result, baseline, max_regression):
+    """Print deltas against a baseline; return False if p95 or throughput regressed."""
+    ok = True
+    rows = [
+        ("p50_ms", result["latency"]["p50_ms"], baseline["latency"]["p50_ms"], True),
+        ("p95_ms", result["latency"]["p95_ms"], baseline["latency"]["p95_ms"], True),
+        ("p99_ms", result["latency"]["p99_ms"], baseline["latency"]["p99_ms"], True),
+        ("throughput_rps", result["throughput_rps"], baseline["throughput_rps"], False),
+    ]
+    print("\nvs baseline:")
+    for name, new, old, lower_is_better in rows:
+        change = (new - old) / old if old else 0.0
+        regressed = change > max_regression if lower_is_better else change < -max_regression
+        if regressed and name in ("p95_ms", "throughput_rps"):
+            ok = False
+        print(f"  {name:<15} {old:>10.2f} -> {new:>10.2f}  ({change:+.1%}){'  ✗' if regressed else ''}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--calendar-latency", type=float, default=0.05)
+    parser.add_argument("--seed-events", type=int, default=200)
+    parser.add_argument("--booking-pct", type=int, default=30)
+    parser.add_argument("--realistic", action="store_true", help="repeat phrasings so caches can hit")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", help="results JSON to diff against")
+    parser.add_argument("--max-regression", type=float, default=0.10)
+    args = parser.parse_args()
+
+    calendar = setup(args)
+    from backend.main import app
+
+    latencies, statuses, elapsed = asyncio.run(drive(app, args))
+
+    result = {
+        "config": vars(args),
+        "latency": summarize(latencies),
+        "throughput_rps": len(latencies) / elapsed,
+        "statuses": statuses,
+        "nodes": {name: summarize(values) for name, values in sorted(node_timings.items())},
+        "calendar_requests": calendar.requests,
+    }
+    print(json.dumps(result, indent=2))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if args.booking_pct > 0 and calendar.requests["insert"] == 0:
+        print("\n✗ no booking reached the calendar; the booking path is not being measured")
+        sys.exit(1)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if not compare(result, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# benchmarks/import_time.py
+#
+# Cold-start report: imports a module in a fresh interpreter under
+# `python -X importtime` and summarises total import time plus the slowest
+# top-level packages. Results can be saved and diffed like the harness.
+#
+#   python -m benchmarks.import_time                       # backend.main
+#   python -m benchmarks.import_time --module agent.calendar --output import.json
+#   python -m benchmarks.import_time --baseline import.json
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# backend.main checks these at import; the values are never used here.
+DUMMY_ENV = {var: "import-time-benchmark" for var in (
+    "GOOGLE_CLIENT_ID", "GOOGLE_CLIENT_SECRET", "GOOGLE_REDIRECT_URI", "GEMINI_API_KEY")}
+
+
+def measure(module):
+    """One cold import; returns (total_us, {top_level_package: cumulative_us})."""
+    env = {**DUMMY_ENV, **os.environ, "PYTHONPATH": ROOT}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+    packages = defaultdict(int)
+    total = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name[1:]
+        # Unindented entries are the imports the top-level module asked for.
+        if not name.startswith(" "):
+            total += int(cumulative_us)
+        packages[name.strip().split(".")[0]] += int(self_us)
+    return total, packages
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="backend.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--output")
+    parser.add_argument("--baseline")
+    parser.add_argument("--max-regression", type=float, default=0.10)
+    args = parser.parse_args()
+
+    totals, per_package = [], defaultdict(list)
+    for _ in range(args.runs):
+        total, packages = measure(args.module)
+        totals.append(total)
+        for name, us in packages.items():
+            per_package[name].append(us)
+
+    median_ms = statistics.median(totals) / 1000
+    slowest = sorted(
+        ((name, statistics.median(v) / 1000) for name, v in per_package.items()),
+        key=lambda item: item[1], reverse=True,
+    )[:args.top]
+
+    result = {"module": args.module, "runs": args.runs, "total_ms": median_ms,
+              "slowest_packages_ms": dict(slowest)}
+    print(json.dumps(result, indent=2))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        change = (median_ms - baseline["total_ms"]) / baseline["total_ms"]
+        print(f"\nvs baseline: {baseline['total_ms']:.1f} ms -> {median_ms:.1f} ms ({change:+.1%})")
+        if change > args.max_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
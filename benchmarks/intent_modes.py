@@ -0,0 +1,80 @@
+# benchmarks/intent_modes.py
+#
+# Sends a corpus of messages to Gemini through both intent extraction modes
+# (INTENT_OUTPUT=json, the free-text prompt + json.loads, and "structured",
+# the trimmed prompt + schema-constrained output) and compares latency,
+# input tokens per call, parse failures and how often the two agree on the
+# resulting AgentState fields. Needs GEMINI_API_KEY.
+#
+#   python -m benchmarks.intent_modes [corpus.txt] [--repeat 3]
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import agent.langgraph_flow as flow
+from benchmarks.harness import summarize
+
+COMPARED_FIELDS = ("intent", "start_time", "end_time", "duration_minutes")
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "fast_path_corpus.txt")
+MODES = ("json", "structured")
+
+
+def _input_tokens(response):
+    raw = response.get("raw") if isinstance(response, dict) else response
+    usage = getattr(raw, "usage_metadata", None) or {}
+    return usage.get("input_tokens", 0)
+
+
+def run_mode(mode, messages, repeat, now_ist):
+    chain = flow.get_chain(mode)
+    latencies, tokens, failures, states = [], [], 0, {}
+    for _ in range(repeat):
+        for message in messages:
+            state = {"input": message}
+            start = time.perf_counter()
+            response = chain.invoke(flow._prompt_inputs(state, now_ist))
+            latencies.append((time.perf_counter() - start) * 1000)
+            tokens.append(_input_tokens(response))
+            result = flow._apply_response(dict(state), response, now_ist)
+            if result["intent"] == "error":
+                failures += 1
+            states[message] = result
+    calls = len(messages) * repeat
+    return {
+        "latency": summarize(latencies),
+        "mean_input_tokens": sum(tokens) / calls if calls else 0.0,
+        "parse_failures": failures,
+        "parse_failure_rate": failures / calls if calls else 0.0,
+    }, states
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("corpus", nargs="?", default=DEFAULT_CORPUS)
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    with open(args.corpus) as f:
+        messages = [line.strip() for line in f if line.strip()]
+
+    now_ist = datetime.now(flow.IST)
+    report, states = {}, {}
+    for mode in MODES:
+        report[mode], states[mode] = run_mode(mode, messages, args.repeat, now_ist)
+
+    agree = sum(
+        all(states["json"][m].get(k) == states["structured"][m].get(k) for k in COMPARED_FIELDS)
+        for m in messages
+    )
+    report["agreement"] = agree / len(messages) if messages else 1.0
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
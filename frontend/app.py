@@ -1,7 +1,14 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 import sys
 import os
+import json
+import time
+import uuid
+import secrets
+import threading
+from cachetools import TTLCache
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,6 +23,35 @@ st.title("📅 AI Calendar Booking Assistant")
 
 # ✅ Backend URL constant
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8080")
+# (connect, read) seconds; the read timeout bounds the gap between SSE lines
+BACKEND_TIMEOUT = (float(os.getenv("BACKEND_CONNECT_TIMEOUT", "3")), float(os.getenv("BACKEND_READ_TIMEOUT", "60")))
+BACKEND_POOL_SIZE = int(os.getenv("BACKEND_POOL_SIZE", "32"))
+
+
+@st.cache_resource
+def backend_session():
+    """One keep-alive Session for the whole server, shared by every script rerun."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=BACKEND_POOL_SIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+@st.cache_resource
+def pending_oauth_states():
+    """OAuth states this server handed out and hasn't seen come back, shared by every session.
+
+    The redirect back from Google opens a fresh Streamlit session, so the
+    state can't be checked against st.session_state.
+    """
+    return threading.Lock(), TTLCache(maxsize=10000, ttl=600)
+
+
+@st.cache_resource(max_entries=1024, ttl=3600, show_spinner=False)
+def calendar_service(token):
+    """Build (and validate) the Calendar client once per token, not once per rerun."""
+    return get_calendar_service(token)
 
 
 # ✅ 1. Check required environment variables
@@ -25,6 +61,11 @@ if missing_keys:
     st.error(f"❌ Missing required environment variables: {', '.join(missing_keys)}")
     st.stop()
 
+# ✅ Per-browser session ID so the backend keeps each user's token separate.
+# Always chosen here, never taken from the URL, so a link can't pick it.
+if "session_id" not in st.session_state:
+    st.session_state["session_id"] = uuid.uuid4().hex
+
 # ✅ 2. Utility: Get full redirect URL including query params
 def get_current_url():
     headers = st.context.headers
@@ -38,14 +79,22 @@ def get_current_url():
 
 # ✅ 3. Handle Google OAuth redirect with ?code=...
 if "code" in st.query_params:
+    lock, states = pending_oauth_states()
+    with lock:
+        issued = states.pop(st.query_params.get("state"), None)
+    if not issued:
+        st.query_params.clear()
+        st.error("❌ This authorization link expired or wasn't started here. Please connect again.")
+        st.stop()
     try:
         full_url = get_current_url()
         save_token_from_code(full_url)
         # st.session_state["token"] is now set by save_token_from_code
 
-        res = requests.post(
+        res = backend_session().post(
             f"{BACKEND_URL}/chat/token",
-            json={"token": st.session_state["token"]} # Pass the actual token string from session state
+            json={"token": st.session_state["token"], "session_id": st.session_state["session_id"]}, # Pass the actual token string from session state
+            timeout=BACKEND_TIMEOUT,
         )
 
         if res.ok:
@@ -65,7 +114,11 @@ if "code" in st.query_params:
 if "token" not in st.session_state or not st.session_state.get("token_ready"):
     st.warning("Please connect your Google Calendar to continue.")
     if st.button("Connect Google Calendar"):
-        auth_url = get_auth_url()
+        state = secrets.token_urlsafe(32)
+        lock, states = pending_oauth_states()
+        with lock:
+            states[state] = True
+        auth_url = get_auth_url(state=state)
         st.markdown(f"[Click here to authorize Google Calendar]({auth_url})", unsafe_allow_html=True)
     st.stop()
 
@@ -76,12 +129,15 @@ if not current_token:
     st.error("Authentication token is missing. Please re-authenticate.")
     st.stop()
 
-try:
-    # Pass the retrieved token to the function
-    get_calendar_service(current_token)
-except Exception as e:
-    st.error(f"❌ Calendar service initialization error: {e}")
-    st.stop()
+# Validate once per browser session; a new token (re-auth) validates again
+if st.session_state.get("validated_token") != current_token:
+    try:
+        # Pass the retrieved token to the function
+        calendar_service(current_token)
+    except Exception as e:
+        st.error(f"❌ Calendar service initialization error: {e}")
+        st.stop()
+    st.session_state["validated_token"] = current_token
 
 # ✅ 6. Chat Interface
 if "history" not in st.session_state:
@@ -89,23 +145,67 @@ if "history" not in st.session_state:
 
 user_input = st.text_input("Ask something (e.g. 'Am I free tomorrow?' or 'Book a meeting for tomorrow, June 1st, 2025, at 10 AM for 30 minutes'): ")
 
+NODE_LABELS = {
+    "input": "🧠 Understanding your request...",
+    "book": "📅 Booking the event...",
+    "check": "🔎 Checking your calendar...",
+    "schedule": "🗓️ Reading your schedule...",
+    "find_slot": "🧮 Finding a time that works for everyone...",
+    "error_handler": "⚠️ Handling an error...",
+}
+
+
+def stream_chat(message, token, session_id):
+    """Yield (event, data) pairs from the backend's /chat/stream SSE endpoint."""
+    with backend_session().post(
+        f"{BACKEND_URL}/chat/stream",
+        json={"message": message, "token": token, "session_id": session_id},
+        stream=True,
+        timeout=BACKEND_TIMEOUT,
+    ) as res:
+        if not res.ok:
+            yield "result", {"response": res.json().get("response", "Error: No response from backend.")}
+            return
+        event = None
+        for line in res.iter_lines(decode_unicode=True):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: ") and event:
+                yield event, json.loads(line[len("data: "):])
+
+
 if st.button("Send") and user_input:
     st.session_state.history.append(("You", user_input))
 
-    try:
-        # ✅ Send user message to backend
-        res = requests.post(
-            f"{BACKEND_URL}/chat",
-            json={
-                "message": user_input,
-                "token": st.session_state.get("token")
-            }
-        )
+    status = st.empty()
+    tokens = st.empty()
+    streamed = ""
+    bot_reply = "Error: No response from backend."
+    started = time.perf_counter()
+    # "accepted" arrives at once; the first token or intent is what the user waits for.
+    first_event_ms = None
 
-        bot_reply = res.json().get("response", "Error: No response from backend.")
+    try:
+        # ✅ Stream progress from the backend as each graph node finishes
+        for event, data in stream_chat(user_input, st.session_state.get("token"), st.session_state["session_id"]):
+            if first_event_ms is None and event in ("token", "intent"):
+                first_event_ms = (time.perf_counter() - started) * 1000
+            if event == "node" and data["status"] == "start":
+                status.info(NODE_LABELS.get(data["node"], data["node"]))
+            elif event == "token":
+                streamed += data["text"]
+                tokens.caption(streamed)
+            elif event == "intent" and data.get("intent"):
+                status.info(f"🧠 Intent: {data['intent']}")
+            elif event == "result":
+                bot_reply = data.get("response", bot_reply)
     except Exception as e:
         bot_reply = f"❌ Failed to contact backend: {e}"
 
+    status.empty()
+    tokens.empty()
+    if first_event_ms is not None:
+        st.caption(f"⏱️ Time to first response: {first_event_ms:.0f} ms")
     st.session_state.history.append(("Bot", bot_reply))
 
 # ✅ 7. Show chat history
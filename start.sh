@@ -1,2 +1,8 @@
 #!/bin/bash
-uvicorn backend.main:app --host 0.0.0.0 --port 10000
+# More than one worker needs a session store every worker can see.
+# CALENDAR_GLOBAL_QPS/BURST are split evenly across the workers.
+WORKERS=${WEB_CONCURRENCY:-1}
+if [ "$WORKERS" -gt 1 ]; then
+  export SESSION_STORE=${SESSION_STORE:-sqlite}
+fi
+uvicorn backend.main:app --host 0.0.0.0 --port 10000 --workers "$WORKERS"
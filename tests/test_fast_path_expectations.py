@@ -0,0 +1,44 @@
+# tests/test_fast_path_expectations.py
+#
+# Offline check of the rule-based fast path against golden expectations
+# (tests/fixtures/fast_path_expected.json): for every corpus message, the
+# hand-written answer PROMPT_TEMPLATE's rules call for. fast_parse must
+# either decline or produce the same AgentState fields that answer does.
+# This is not the model-agreement check; that needs Gemini and is
+# `python -m benchmarks.fast_path_agreement`.
+
+import json
+import os
+from datetime import datetime
+
+from agent.fast_parser import fast_parse
+from benchmarks.fast_path_agreement import disagreement, load_corpus
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "fast_path_expected.json")
+
+
+def _expected():
+    with open(FIXTURE) as f:
+        golden = json.load(f)
+    return datetime.fromisoformat(golden["now"]), golden["expected"]
+
+
+def test_fixture_covers_corpus():
+    _, expected = _expected()
+    missing = [m for m in load_corpus() if m not in expected]
+    assert not missing, f"add expectations for {missing}"
+
+
+def test_fast_path_matches_expectations_or_declines():
+    now_ist, expected = _expected()
+    claimed, disagreements = 0, {}
+    for message, expected_parsed in expected.items():
+        fast = fast_parse(message, now_ist)
+        if fast is None:
+            continue
+        claimed += 1
+        diff = disagreement(message, fast, expected_parsed, now_ist)
+        if diff:
+            disagreements[message] = diff
+    assert claimed, "the fast path declined every message"
+    assert not disagreements